@@ -0,0 +1,272 @@
+# 木取り・候補評価・木取図描画のベンチマーク
+#   python benchmarks/bench.py run --out baseline.json            # 計測して JSON に保存
+#   python benchmarks/bench.py run --quick --compare baseline.json  # 計測して前回と比べる
+#   python benchmarks/bench.py compare baseline.json new.json      # 2つの結果を比べる
+# 切板リストは乱数の種を固定して作るので、同じ指定なら毎回同じ入力になる。
+# compare は「遅くなった」「メモリが増えた」「板が増えた・歩留まりが下がった」ケースを表示し、
+# 1件でもあれば終了コード 1 を返す（CI で使える）。
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _root not in sys.path:
+    sys.path.insert(0, _root)
+from trunktech import TrunkTechEngine, evaluate_candidates, parse_boards, render_sheet
+
+BOARDS = ("3x6", "4x8", "集成材")
+SIZES = (10, 100, 1000, 10000, 100000)
+QUICK_SIZES = (10, 100, 1000)
+STAGES = ("pack", "rank", "svg", "matplotlib")
+KERF = 3.0
+
+
+# --- 切板リストの生成（n は部品の総数＝枚数の合計） ---
+def gen_few_sizes(n, rng):
+    """少ない寸法（5種類）を大量に"""
+    sizes = [(rng.randint(300, 900), rng.randint(150, 450)) for _ in range(5)]
+    qty = [n // 5 + (1 if i < n % 5 else 0) for i in range(5)]
+    return [{"n": f"F{i}", "w": w, "d": d, "qty": q} for i, ((w, d), q) in enumerate(zip(sizes, qty)) if q > 0]
+
+
+def gen_unique_sizes(n, rng):
+    """全部品が別寸法（枚数 1）"""
+    return [{"n": f"U{i}", "w": rng.randint(100, 1200), "d": rng.randint(50, 450), "qty": 1} for i in range(n)]
+
+
+def gen_near_board(n, rng):
+    """3x6 の定尺に近い大きな部品（1枚に1〜2個しか入らない）"""
+    kinds = max(1, min(n, 20))
+    sizes = [(rng.randint(1200, 1810), rng.randint(420, 900)) for _ in range(kinds)]
+    qty = [n // kinds + (1 if i < n % kinds else 0) for i in range(kinds)]
+    return [{"n": f"N{i}", "w": w, "d": d, "qty": q} for i, ((w, d), q) in enumerate(zip(sizes, qty)) if q > 0]
+
+
+def gen_mixed(n, rng):
+    """家具の注文に近い混在（数十種類、枚数はばらばら）"""
+    kinds = max(1, min(n, 50))
+    weights = [rng.random() for _ in range(kinds)]
+    total = sum(weights)
+    qty = [max(1, int(n * w / total)) for w in weights]
+    qty[0] += n - sum(qty)
+    return [
+        {"n": f"M{i}", "w": rng.randint(150, 1500), "d": rng.randint(80, 600), "qty": q}
+        for i, q in enumerate(qty) if q > 0
+    ]
+
+
+GENERATORS = {
+    "few_sizes": gen_few_sizes,
+    "unique_sizes": gen_unique_sizes,
+    "near_board": gen_near_board,
+    "mixed": gen_mixed,
+}
+
+
+def make_parts(generator, n, seed):
+    return GENERATORS[generator](n, random.Random(f"{seed}:{generator}:{n}"))
+
+
+# --- 計測 ---
+def _measure(func, repeat):
+    """func() を repeat 回実行して最短時間（ms）を、別に1回 tracemalloc 付きで実行してピークメモリを測る。"""
+    best = float("inf")
+    value = None
+    for _ in range(repeat):
+        t = time.perf_counter()
+        value = func()
+        best = min(best, (time.perf_counter() - t) * 1000)
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return value, best, peak
+
+
+def _layout_stats(layout, n_requested):
+    area = layout.sheet_count * layout.vw * layout.vh
+    return {
+        "sheet_count": layout.sheet_count,
+        "parts_placed": layout.part_count,
+        "parts_requested": n_requested,
+        "utilization": round(layout.used_area() / area, 6) if area else 0.0,
+    }
+
+
+def _have_matplotlib():
+    try:
+        import matplotlib  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def run_case(stage, generator, n, board, seed, repeat, render_sheets):
+    parts = make_parts(generator, n, seed)
+    vw, vh, label = parse_boards(board)[0]
+    n_requested = sum(p["qty"] for p in parts)
+    engine = TrunkTechEngine(kerf=KERF)
+    if stage == "pack":
+        layout, ms, peak = _measure(lambda: engine.pack_layout(parts, vw, vh), repeat)
+        record = _layout_stats(layout, n_requested)
+    elif stage == "rank":
+        (best, _), ms, peak = _measure(
+            lambda: evaluate_candidates(parts, [(vw, vh, label)], KERF, workers=1), repeat
+        )
+        record = _layout_stats(best["layout"], n_requested)
+    else:
+        layout = engine.pack_layout(parts, vw, vh)
+        sheets = range(min(render_sheets, layout.sheet_count))
+        _, ms, peak = _measure(lambda: [render_sheet(layout, s, label, stage) for s in sheets], repeat)
+        record = {"sheets_rendered": len(sheets)}
+    record.update({"wall_ms": round(ms, 3), "peak_kb": round(peak / 1024, 1)})
+    return record
+
+
+def iter_cases(stages, generators, sizes, boards, max_render_parts, max_rank_parts):
+    for stage in stages:
+        for generator in generators:
+            for n in sizes:
+                if stage in ("svg", "matplotlib") and n > max_render_parts:
+                    continue
+                if stage == "rank" and n > max_rank_parts:
+                    continue
+                for board in boards:
+                    yield stage, generator, n, board
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=_root, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def cmd_run(args):
+    stages = [s for s in args.stages.split(",") if s]
+    if "matplotlib" in stages and not _have_matplotlib():
+        print("matplotlib が無いので matplotlib の描画は計測しません", file=sys.stderr)
+        stages.remove("matplotlib")
+    sizes = [int(v) for v in args.sizes.split(",")] if args.sizes else (QUICK_SIZES if args.quick else SIZES)
+    max_render_parts = min(args.max_render_parts, 100) if args.quick else args.max_render_parts
+    results = {}
+    for stage, generator, n, board in iter_cases(
+        stages, args.generators.split(","), sizes, args.boards.split(","), max_render_parts, args.max_rank_parts
+    ):
+        case = f"{stage}/{generator}/{n}/{board}"
+        results[case] = run_case(stage, generator, n, board, args.seed, args.repeat, args.render_sheets)
+        r = results[case]
+        extra = f" sheets={r['sheet_count']} util={r['utilization']:.3f}" if "sheet_count" in r else ""
+        print(f"{case:40s} {r['wall_ms']:10.1f} ms {r['peak_kb']:10.0f} KB{extra}", file=sys.stderr)
+    data = {
+        "meta": {
+            "commit": _git_commit(),
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            return report(compare(json.load(f), data, args.time_tolerance, args.mem_tolerance, args.min_ms))
+    return 0
+
+
+# --- 比較 ---
+def compare(old, new, time_tolerance=0.15, mem_tolerance=0.25, min_ms=1.0):
+    """2つの結果を比べ、悪化したケースを [(case, 種類, 旧, 新), ...] で返す。
+    時間は min_ms 未満の差（計測の揺れ）を無視する。板枚数・歩留まりは少しでも悪化したら出す。"""
+    problems = []
+    old_results, new_results = old["results"], new["results"]
+    for case, n in new_results.items():
+        o = old_results.get(case)
+        if o is None:
+            continue
+        if n["wall_ms"] > o["wall_ms"] * (1 + time_tolerance) and n["wall_ms"] - o["wall_ms"] >= min_ms:
+            problems.append((case, "slower", o["wall_ms"], n["wall_ms"]))
+        if n["peak_kb"] > o["peak_kb"] * (1 + mem_tolerance) and n["peak_kb"] - o["peak_kb"] >= 64:
+            problems.append((case, "memory", o["peak_kb"], n["peak_kb"]))
+        if "sheet_count" in n and "sheet_count" in o:
+            if n["parts_placed"] < o["parts_placed"]:
+                problems.append((case, "fewer_parts", o["parts_placed"], n["parts_placed"]))
+            if n["sheet_count"] > o["sheet_count"]:
+                problems.append((case, "more_sheets", o["sheet_count"], n["sheet_count"]))
+            elif n["utilization"] < o["utilization"] - 1e-6:
+                problems.append((case, "lower_yield", o["utilization"], n["utilization"]))
+    return problems
+
+
+def report(problems):
+    for case, kind, o, n in problems:
+        ratio = f" ({n / o:.2f}x)" if kind in ("slower", "memory") and o else ""
+        print(f"REGRESSION {kind:12s} {case:40s} {o} -> {n}{ratio}")
+    print(f"{len(problems)} regressions" if problems else "no regressions")
+    return 1 if problems else 0
+
+
+def cmd_compare(args):
+    with open(args.old, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(args.new, encoding="utf-8") as f:
+        new = json.load(f)
+    return report(compare(old, new, args.time_tolerance, args.mem_tolerance, args.min_ms))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="TrunkTechEngine のベンチマーク")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def add_tolerances(p):
+        p.add_argument("--time-tolerance", type=float, default=0.15, help="遅くなったとみなす割合（既定 0.15）")
+        p.add_argument("--mem-tolerance", type=float, default=0.25, help="メモリが増えたとみなす割合（既定 0.25）")
+        p.add_argument("--min-ms", type=float, default=1.0, help="これ未満の時間差は無視する ms（既定 1.0）")
+
+    p = sub.add_parser("run", help="計測して JSON に保存する")
+    p.add_argument("--out", help="結果の JSON")
+    p.add_argument("--compare", help="前回の JSON と比べる")
+    p.add_argument("--quick", action="store_true", help="部品数 1000 まで（描画は 100 まで）にする")
+    p.add_argument("--sizes", help="部品数（カンマ区切り。既定 10,100,1000,10000,100000）")
+    p.add_argument("--stages", default=",".join(STAGES), help="pack,rank,svg,matplotlib のうち計測するもの")
+    p.add_argument("--generators", default=",".join(GENERATORS), help=",".join(GENERATORS))
+    p.add_argument("--boards", default=",".join(BOARDS), help="3x6,4x8,集成材（1820x910 のような指定も可）")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--repeat", type=int, default=3, help="各ケースの実行回数（最短時間を記録）")
+    p.add_argument("--render-sheets", type=int, default=10, help="描画の計測で描く板の枚数")
+    p.add_argument("--max-render-parts", type=int, default=1000, help="描画を計測する部品数の上限")
+    p.add_argument("--max-rank-parts", type=int, default=10000, help="候補評価を計測する部品数の上限")
+    add_tolerances(p)
+    p.set_defaults(func=cmd_run)
+
+    p = sub.add_parser("compare", help="2つの結果を比べて悪化したケースを表示する")
+    p.add_argument("old")
+    p.add_argument("new")
+    add_tolerances(p)
+    p.set_defaults(func=cmd_compare)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,308 +1,344 @@
-import sys
-from types import ModuleType
+import time
+
+_startup_t0 = time.perf_counter()
 
-# --- Python 3.12/3.13 互換性パッチ ---
-if 'distutils' not in sys.modules:
-    d = ModuleType('distutils'); d.version = ModuleType('distutils.version')
-    class LooseVersion:
-        def __init__(self, vstring): self.vstring = vstring
-        def __lt__(self, other): return False
-    d.version.LooseVersion = LooseVersion; sys.modules['distutils'] = d; sys.modules['distutils.version'] = d.version
+import sys
 
 import streamlit as st
-import matplotlib
-matplotlib.use("Agg")
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
-import matplotlib.font_manager as fm
-import pandas as pd
-import base64
 import os
-import io
 
 # 共通モジュール（テーブル白背景）を読み込む（同フォルダの streamlit_common を参照）
 _root = os.path.dirname(os.path.abspath(__file__))
 if _root not in sys.path:
     sys.path.insert(0, _root)
-from streamlit_common import inject_table_white_bg
-
-# --- 1. アプリ設定・日本語豆腐文字対策 ---
+from streamlit_common import inject_background_theme, inject_table_white_bg
+from trunktech import PackCache, RenderCache, TrunkTechEngine, as_long_short, evaluate_candidates, write_print_html
+from trunktech.export import iter_cut_csv, iter_dxf, write_export
+from trunktech.incremental import repack_result
+from trunktech.ingest import ingest_chunks, ingest_frame, read_cut_list, result_frame, result_parts
+from trunktech.jobs import JobManager
+from trunktech.offcuts import OffcutInventory, attach_offcuts, claim_and_record, pack_offcuts
+from trunktech.perf import PerfRecorder, profiled
+from trunktech.render import render_sheet as render_sheet_impl
+from trunktech.render import diagram_items, render_thumbnails
+from trunktech.svg import format_ids, offcut_title, pattern_name
+from trunktech.store import MAX_REBUILD_DEPTH, ResultStore, budget_bytes, make_recipe
+
+# 起動・再実行の時間計測（環境変数 ITADORI_STARTUP_REPORT=1 で画面下部とログに表示）
+# matplotlib・pandas は重いので、木取図の matplotlib 描画・表の表示で必要になるまで読み込まない
+STARTUP_REPORT = os.environ.get("ITADORI_STARTUP_REPORT") == "1"
+_startup_marks = [("import", time.perf_counter())]
+
+# 処理の時間・件数（再実行ごとに作る）。木取りを計算した回は画面の「処理時間の内訳」と
+# 標準エラーの1行 JSON（itadori perf ...）に出す。ITADORI_PROFILE で cProfile も取れる（trunktech.perf）
+perf = PerfRecorder("mokudori")
+
+# --- 1. アプリ設定（日本語フォントの設定は trunktech.render で PNG を描くときに行う） ---
 st.set_page_config(page_title="TRUNK TECH - イタドリ (木取り特化)", layout="wide")
-plt.rcParams['font.family'] = 'sans-serif'
-plt.rcParams['font.sans-serif'] = ['IPAexGothic', 'Noto Sans CJK JP', 'DejaVu Sans']
-
-def _setup_japanese_font():
-    """木取図（PNG）内の日本語を表示するフォントを用意する。
-    1) アプリ同梱: リポジトリの font/IPAexGothic.ttf（GitHub・クラウドで必須）
-    2) Linux: サーバーに入っている Noto CJK 等
-    3) Windows: C:\\Windows\\Fonts の MS ゴシック等
-    戻り値: FontProperties（パス指定）。見つからなければ None。"""
-    def try_path(path):
-        if not path or not os.path.isfile(path):
-            return None
-        try:
-            if hasattr(fm.fontManager, "addfont"):
-                fm.fontManager.addfont(path)
-            prop = fm.FontProperties(fname=path)
-            name = prop.get_name()
-            plt.rcParams["font.sans-serif"] = [name] + [
-                x for x in plt.rcParams["font.sans-serif"] if x != name
-            ]
-            plt.rcParams["font.family"] = "sans-serif"
-            return prop
-        except Exception:
-            return None
-
-    # 1) リポジトリに同梱したフォント（GitHub プッシュ → クラウドで動く場合はここが有効）
-    # IPAex Ver.004.01 のゴシックは ipaexg.ttf、旧表記は IPAexGothic.ttf
-    app_fonts = [
-        os.path.join(_root, "font", "ipaexg.ttf"),
-        os.path.join(_root, "font", "IPAexGothic.ttf"),
-        os.path.join(_root, "fonts", "ipaexg.ttf"),
-        os.path.join(_root, "fonts", "IPAexGothic.ttf"),
-        os.path.join(_root, "ipaexg.ttf"),
-        os.path.join(_root, "IPAexGothic.ttf"),
-    ]
-    for path in app_fonts:
-        prop = try_path(path)
-        if prop is not None:
-            return prop
-
-    # 2) Linux（Streamlit Cloud 等）でよくあるパス
-    linux_fonts = [
-        "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
-        "/usr/share/fonts/truetype/fonts-japanese-gothic/ttf/IPAexGothic.ttf",
-    ]
-    for path in linux_fonts:
-        prop = try_path(path)
-        if prop is not None:
-            return prop
-
-    # 3) Windows の標準フォント（PC で streamlit run する場合）
-    windir = os.environ.get("SystemRoot", os.environ.get("WINDIR", "C:\\Windows"))
-    fonts_dir = os.path.join(windir, "Fonts")
-    for fname in ["msgothic.ttc", "msmincho.ttc", "meiryo.ttc", "yugothm.ttc"]:
-        prop = try_path(os.path.join(fonts_dir, fname))
-        if prop is not None:
-            return prop
-
-    return None
-
-# 図中のテキストで必ず使うフォント（パス指定で確実に表示）
-_jp_font = _setup_japanese_font()
 
 # --- 背景画像 & 視認性100% 白背景CSS ---
-def set_design_theme(image_file):
-    if os.path.exists(image_file):
-        with open(image_file, "rb") as f:
-            img_data = f.read()
-        b64_encoded = base64.b64encode(img_data).decode()
-        style = f"""
-        <style>
-        .stApp {{
-            background-image: url("data:image/png;base64,{b64_encoded}");
-            background-size: cover;
-            background-position: center;
-            background-attachment: fixed;
-        }}
-        /* メインエリアは透過 → itadori.jpg が背後に表示される（強すぎる白指定はしない） */
-        [data-testid="stAppViewBlockContainer"],
-        [data-testid="stAppViewContainer"] > section,
-        [data-testid="stAppViewContainer"] .block-container,
-        main .block-container {{
-            background-color: transparent !important;
-            padding: 3rem !important;
-        }}
-        /* 棚板リスト：スクロールバーなしで全行表示（高さを自動に） */
-        [data-testid="stDataFrame"] .ag-body-viewport,
-        [data-testid="stDataFrame"] .ag-center-cols-viewport {{
-            overflow: visible !important;
-            max-height: none !important;
-        }}
-        [data-testid="stDataFrame"] .ag-root-wrapper {{
-            height: auto !important;
-        }}
-        /* 半透明にして背景の鳥（itadori.jpg）が透けて見えるように */
-        [data-testid="stDataFrame"],
-        [data-testid="stDataFrame"] > div,
-        [data-testid="stDataFrame"] .ag-root-wrapper,
-        [data-testid="stDataFrame"] .ag-cell,
-        [data-testid="stDataFrame"] .ag-header,
-        [data-testid="stTable"],
-        [data-testid="stTable"] table,
-        [data-testid="stTable"] th,
-        [data-testid="stTable"] td {{
-            background-color: rgba(255, 255, 255, 0.88) !important;
-        }}
-        /* ラジオ・入力欄が確実にクリックできるように */
-        [data-testid="stRadio"] {{ pointer-events: auto !important; }}
-        [data-testid="stRadio"] * {{ pointer-events: auto !important; }}
-        /* ラベル文字を太くしてクッキリ見せる */
-        [data-testid="stWidgetLabel"] p {{ font-weight: bold !important; color: #000 !important; }}
-        /* 左カラム幅を 500px で固定（画面比ではなく数値指定） */
-        [class*="main_layout_500"] [data-testid="stHorizontalBlock"] > div:first-child {{
-            width: 500px !important;
-            max-width: 500px !important;
-            min-width: 500px !important;
-            flex: 0 0 500px !important;
-        }}
-        [class*="main_layout_500"] [data-testid="stHorizontalBlock"] > div:last-child {{
-            flex: 1 1 auto !important;
-        }}
-        /* スマホ表示時のみカラム幅を 100% に（768px 以下をスマホ・タブレットとみなす） */
-        @media (max-width: 768px) {{
-            [class*="main_layout_500"] [data-testid="stHorizontalBlock"] > div:first-child {{
-                width: 100% !important;
-                max-width: 100% !important;
-                min-width: 0 !important;
-                flex: 1 1 100% !important;
-            }}
-            [class*="main_layout_500"] [data-testid="stHorizontalBlock"] > div:last-child {{
-                display: none !important;
-            }}
-        }}
-        /* 大画面時のみ：スマホ用の木取図ブロック（下に表示）を非表示 → 右カラムで表示 */
-        @media (min-width: 769px) {{
-            [class*="mokudori_mobile"] {{
-                display: none !important;
-            }}
-        }}
-        /* タイトル＋Powered by バッジ（大画面では横並び、狭い画面ではタイトル下に表示） */
-        .title-with-badge .title-main {{
-            font-size: 2.25rem !important;
-            font-weight: 700 !important;
-        }}
-        .title-with-badge .powered-badge {{
-            font-size: 0.65rem !important;
-            font-weight: normal !important;
-            color: #fff !important;
-            background-color: #333 !important;
-            padding: 2px 8px !important;
-            margin-left: 8px !important;
-            border-radius: 4px !important;
-        }}
-        @media (max-width: 768px) {{
-            .title-with-badge .powered-badge {{
-                display: block !important;
-                margin-left: 0 !important;
-                margin-top: 6px !important;
-                width: fit-content !important;
-            }}
-        }}
-        </style>
-        """
-        st.markdown(style, unsafe_allow_html=True)
-
-inject_table_white_bg(st)
-set_design_theme("itadori.jpg")
-
-# --- 2. 木取りエンジン (TrunkTechEngine) ---
-def _normalize_part(p):
-    """長方形部品は定尺板の長手方向に長辺を沿わせるため、w=長辺・d=短辺に正規化する。"""
-    w, d = p["w"], p["d"]
-    return {**p, "w": max(w, d), "d": min(w, d)}
-
-
-class TrunkTechEngine:
-    def __init__(self, kerf: float = 3.0):
-        self.kerf = kerf
-
-    def pack_sheets(self, parts, vw, vh):
-        """
-        定尺板 vw(長手) x vh(短手) に部品を配置する。
-        長方形部品は必ず長辺を長手方向(vw)に、短辺を短手方向(vh)に配置する。
-        定尺を超える部品は配置しない。
-        """
-        normalized = [_normalize_part(dict(p)) for p in parts]
-        valid = [p for p in normalized if p["w"] <= vw and p["d"] <= vh]
-        if len(valid) < len(normalized):
-            # 定尺を超える部品は除外（UIで警告するため件数を返せるようにする場合は呼び出し元で対応）
-            pass
-        sorted_parts = sorted(valid, key=lambda x: (x["w"], x["d"]), reverse=True)
-        sheets = []
-
-        def pack(p):
-            for s in sheets:
-                for r in s["rows"]:
-                    if r["h"] >= p["d"] and (vw - r["used_w"]) >= p["w"]:
-                        r["parts"].append({"n": p["n"], "x": r["used_w"], "y": r["y"], "w": p["w"], "h": p["d"]})
-                        r["used_w"] += p["w"] + self.kerf
-                        return True
-                if (vh - s["used_h"]) >= p["d"]:
-                    s["rows"].append({
-                        "y": s["used_h"], "h": p["d"], "used_w": p["w"] + self.kerf,
-                        "parts": [{"n": p["n"], "x": 0, "y": s["used_h"], "w": p["w"], "h": p["d"]}],
-                    })
-                    s["used_h"] += p["d"] + self.kerf
-                    return True
-            return False
-
-        for p in sorted_parts:
-            if not pack(p):
-                if p["w"] <= vw and p["d"] <= vh:
-                    sheets.append({
-                        "id": len(sheets) + 1,
-                        "used_h": p["d"] + self.kerf,
-                        "rows": [{
-                            "y": 0, "h": p["d"], "used_w": p["w"] + self.kerf,
-                            "parts": [{"n": p["n"], "x": 0, "y": 0, "w": p["w"], "h": p["d"]}],
-                        }],
-                    })
-        return sheets
-
-
-def render_sheet_to_png_bytes(sheet, v_w_full, v_h_full, label):
-    """1枚の木取図をPNGバイト列で返す（印刷用）"""
-    fig, ax = plt.subplots(figsize=(6, 3))
-    ax.set_xlim(0, v_w_full)
-    ax.set_ylim(0, v_h_full)
-    ax.set_aspect("equal")
-    ax.add_patch(patches.Rectangle((0, 0), v_w_full, v_h_full, fc="#fdf5e6", ec="#8b4513", lw=2))
-    kw_t = {"fontsize": 10, "fontweight": "bold"}
-    if _jp_font is not None:
-        kw_t["fontproperties"] = _jp_font
-    ax.set_title(f"【木取り図】 ID:{sheet['id']} ({label}：{int(v_w_full)}x{int(v_h_full)})", **kw_t)
-    kw_txt = {"ha": "center", "va": "center", "fontsize": 6, "fontweight": "bold"}
-    if _jp_font is not None:
-        kw_txt["fontproperties"] = _jp_font
-    for r in sheet["rows"]:
-        for p in r["parts"]:
-            ax.add_patch(patches.Rectangle((p["x"], p["y"]), p["w"], p["h"], lw=1, ec="black", fc="#deb887", alpha=0.8))
-            ax.text(p["x"] + p["w"] / 2, p["y"] + p["h"] / 2, f"{p['n']}\n{int(p['w'])}x{int(p['h'])}", **kw_txt)
-    buf = io.BytesIO()
-    fig.savefig(buf, format="png", dpi=150, bbox_inches="tight")
-    plt.close(fig)
-    buf.seek(0)
-    return base64.b64encode(buf.read()).decode("utf-8")
-
-
-def build_print_html(best, max_per_page=None):
-    """木取図を印刷用HTMLに出力。max_per_page指定時はその枚数でページ分割、未指定時は1枚ずつ1ページ"""
-    v_w_full = best["vw"] + 2
-    v_h_full = best["vh"] + 2
-    label = best["label"]
-    images_b64 = []
-    for s in best["sheets"]:
-        images_b64.append(render_sheet_to_png_bytes(s, v_w_full, v_h_full, label))
-    # 固定せず：未指定なら1枚1ページ、指定があればその枚数でまとめる（目安として可変）
-    chunk = max_per_page if max_per_page is not None and max_per_page >= 1 else 1
-    pages = [images_b64[i : i + chunk] for i in range(0, len(images_b64), chunk)]
-    html_parts = []
-    html_parts.append("""<!DOCTYPE html><html><head><meta charset="utf-8">
-<style>
-@media print { @page { size: A4; margin: 10mm; } body { margin: 0; } }
-.diagram-page { page-break-after: always; padding: 0; }
-.diagram-page:last-child { page-break-after: auto; }
-.diagram-img { width: 100%; max-height: 32%; object-fit: contain; margin-bottom: 2mm; }
-h1 { font-size: 14pt; margin-bottom: 4mm; }
-</style></head><body>""")
-    for i, page_imgs in enumerate(pages):
-        html_parts.append(f'<div class="diagram-page"><h1>木取図（{label}）— {i+1}ページ目</h1>')
-        for j, b64 in enumerate(page_imgs):
-            html_parts.append(f'<img class="diagram-img" src="data:image/png;base64,{b64}" alt="木取図{j+1}"/>')
-        html_parts.append("</div>")
-    html_parts.append("</body></html>")
-    return "".join(html_parts)
+# 背景画像は static/ に置き、静的ファイル配信（.streamlit/config.toml）で URL として渡す。
+# 画像の読み込み・CSS の組み立ては streamlit_common 側でプロセスにつき1回だけ行う。
+THEME_IMAGE = os.path.join(_root, "static", "itadori.jpg")
+THEME_CSS = """
+/* メインエリアは透過 → itadori.jpg が背後に表示される（強すぎる白指定はしない） */
+[data-testid="stAppViewBlockContainer"],
+[data-testid="stAppViewContainer"] > section,
+[data-testid="stAppViewContainer"] .block-container,
+main .block-container {
+    background-color: transparent !important;
+    padding: 3rem !important;
+}
+/* 棚板リスト：スクロールバーなしで全行表示（高さを自動に） */
+[data-testid="stDataFrame"] .ag-body-viewport,
+[data-testid="stDataFrame"] .ag-center-cols-viewport {
+    overflow: visible !important;
+    max-height: none !important;
+}
+[data-testid="stDataFrame"] .ag-root-wrapper {
+    height: auto !important;
+}
+/* 半透明にして背景の鳥（itadori.jpg）が透けて見えるように */
+[data-testid="stDataFrame"],
+[data-testid="stDataFrame"] > div,
+[data-testid="stDataFrame"] .ag-root-wrapper,
+[data-testid="stDataFrame"] .ag-cell,
+[data-testid="stDataFrame"] .ag-header,
+[data-testid="stTable"],
+[data-testid="stTable"] table,
+[data-testid="stTable"] th,
+[data-testid="stTable"] td {
+    background-color: rgba(255, 255, 255, 0.88) !important;
+}
+/* ラジオ・入力欄が確実にクリックできるように */
+[data-testid="stRadio"] { pointer-events: auto !important; }
+[data-testid="stRadio"] * { pointer-events: auto !important; }
+/* ラベル文字を太くしてクッキリ見せる */
+[data-testid="stWidgetLabel"] p { font-weight: bold !important; color: #000 !important; }
+/* 左カラム幅を 500px で固定（画面比ではなく数値指定） */
+[class*="main_layout_500"] [data-testid="stHorizontalBlock"] > div:first-child {
+    width: 500px !important;
+    max-width: 500px !important;
+    min-width: 500px !important;
+    flex: 0 0 500px !important;
+}
+[class*="main_layout_500"] [data-testid="stHorizontalBlock"] > div:last-child {
+    flex: 1 1 auto !important;
+}
+/* スマホ表示時のみカラム幅を 100% に（768px 以下をスマホ・タブレットとみなす） */
+@media (max-width: 768px) {
+    [class*="main_layout_500"] [data-testid="stHorizontalBlock"] > div:first-child {
+        width: 100% !important;
+        max-width: 100% !important;
+        min-width: 0 !important;
+        flex: 1 1 100% !important;
+    }
+    [class*="main_layout_500"] [data-testid="stHorizontalBlock"] > div:last-child {
+        display: none !important;
+    }
+}
+/* 大画面時のみ：スマホ用の木取図ブロック（下に表示）を非表示 → 右カラムで表示 */
+@media (min-width: 769px) {
+    [class*="mokudori_mobile"] {
+        display: none !important;
+    }
+}
+/* タイトル＋Powered by バッジ（大画面では横並び、狭い画面ではタイトル下に表示） */
+.title-with-badge .title-main {
+    font-size: 2.25rem !important;
+    font-weight: 700 !important;
+}
+.title-with-badge .powered-badge {
+    font-size: 0.65rem !important;
+    font-weight: normal !important;
+    color: #fff !important;
+    background-color: #333 !important;
+    padding: 2px 8px !important;
+    margin-left: 8px !important;
+    border-radius: 4px !important;
+}
+@media (max-width: 768px) {
+    .title-with-badge .powered-badge {
+        display: block !important;
+        margin-left: 0 !important;
+        margin-top: 6px !important;
+        width: fit-content !important;
+    }
+}
+"""
+
+with perf.phase("theme"):
+    inject_table_white_bg(st)
+    inject_background_theme(st, THEME_IMAGE, THEME_CSS)
+_startup_marks.append(("theme", time.perf_counter()))
+
+@st.cache_resource
+def get_pack_cache():
+    """木取り結果のキャッシュ（全セッションで共有）。環境変数 ITADORI_PACK_CACHE に
+    SQLite ファイルのパスを指定すると、再起動後も結果を使い回せる。"""
+    return PackCache(max_entries=256, path=os.environ.get("ITADORI_PACK_CACHE"), max_bytes=budget_bytes("pack_cache"))
+
+
+# --- 2. 木取図の描画（木取りエンジン本体は trunktech パッケージ） ---
+# 木取図は1枚につき1回だけ描き、右カラム・スマホ表示・印刷用HTMLで同じ画像を使い回す
+# 既定は SVG（trunktech.svg・matplotlib 不要で高速、印刷もベクター）。
+# 環境変数 ITADORI_RENDERER=matplotlib で従来の matplotlib（PNG）描画に戻せる
+SHEET_RENDERER = os.environ.get("ITADORI_RENDERER", "svg")
+
+
+@st.cache_resource
+def get_render_cache():
+    """描画済み木取図のキャッシュ（全セッションで共有・既定 128MB まで）"""
+    return RenderCache(max_bytes=budget_bytes("render_cache"))
+
+
+# 木取り結果は全セッションで共有する置き場（trunktech.store）に内容ごとに1つだけ置き、
+# session_state["diagram_result"] には小さなハンドルだけを持たせる。置き場・計算結果のキャッシュ・木取図のキャッシュは
+# 合わせて ITADORI_MEMORY_MB（既定 512MB）までにする（trunktech.store.BUDGET_SHARES の割合で分ける）。
+# 上限を超えて捨てられた結果は、次に表示するときにハンドルの入力から計算し直す
+@st.cache_resource
+def get_result_store():
+    """木取り結果の置き場（全セッションで共有）"""
+    return ResultStore()
+
+
+# 端材の在庫（trunktech.offcuts）。ファイルは ITADORI_OFFCUTS（既定は ~/.cache/itadori/offcuts.sqlite）。
+# 「在庫の端材を使う」で計算した木取りは、新しい板より先に端材へ部品を置く。
+# 在庫が変わるのは「確定」ボタンを押したときだけ（使った端材を取り出し、新しく出た端材を登録する）
+@st.cache_resource
+def get_offcut_inventory():
+    """端材の在庫（全セッションで共有）"""
+    return OffcutInventory()
+
+
+def render_sheet(layout, s, label, title=None):
+    """layout の s 番目の板の木取図（trunktech.render）。描画済みなら描き直さない。"""
+    return render_sheet_impl(layout, s, label, SHEET_RENDERER, get_render_cache(), perf, title)
+
+
+def write_print_download(best, per_page, render_cache):
+    """ダウンロードボタンを押したときに印刷用HTMLを作る（時間は別の1行 JSON で記録）"""
+    print_perf = PerfRecorder("print")
+    with print_perf.phase("print_html"):
+        f = write_print_html(best, per_page, SHEET_RENDERER, render_cache, perf=print_perf)
+    print("itadori perf " + print_perf.log_line(sheets=best["layout"].sheet_count), file=sys.stderr, flush=True)
+    return f
+
+
+def write_export_download(kind, best):
+    """パネルソー用の切断手順 CSV（kind="cuts"）・DXF（kind="dxf"）をダウンロードするときに作る（trunktech.export）"""
+    export_perf = PerfRecorder("export")
+    with export_perf.phase(f"export:{kind}"):
+        if kind == "dxf":
+            f = write_export(iter_dxf(best), encoding="cp932", perf=export_perf)
+        else:
+            f = write_export(iter_cut_csv(best), encoding="utf-8-sig", perf=export_perf)
+    print("itadori perf " + export_perf.log_line(sheets=best["layout"].sheet_count), file=sys.stderr, flush=True)
+    return f
+
+
+# --- 木取図の表示（ページ送り） ---
+# 木取図は同じ並びの板をパターンにまとめて（trunktech.render.diagram_items）、パターンごとに1枚描く。
+# 板が多い木取りでも、再実行ごとに描いて送るのは1ページ分（SHEETS_PER_PAGE 枚）だけにする。
+# 「縮小」表示は部品の文字を省いた縮小図をまとめて描いて並べ、選んだ1枚だけを原寸で描く。
+# 表示中のページを出した後、次のページの図をバックグラウンドで描いてキャッシュに入れておく（先読み）
+SHEETS_PER_PAGE = int(os.environ.get("ITADORI_SHEETS_PER_PAGE", 12))
+VIEW_THUMBS = "縮小（一覧）"
+VIEW_FULL = "原寸（部品名・寸法）"
+
+
+def show_sheets(best, viewer, thumb_cols):
+    """viewer（表示するページの図・表示方法・拡大する図）の木取図を出す（右カラム・スマホ表示で共通）"""
+    layout, label = best["layout"], best["label"]
+    if viewer["view"] == VIEW_FULL:
+        for item in viewer["items"]:
+            st.image(render_sheet(layout, item["sheet"], label, item["title"]), use_container_width=True)
+        return
+    focus = viewer["focus"]
+    if focus is not None:
+        st.image(render_sheet(layout, focus["sheet"], label, focus["title"]), use_container_width=True)
+    thumbs = render_thumbnails(
+        layout, [item["sheet"] for item in viewer["items"]], label, SHEET_RENDERER, get_render_cache(), perf,
+        titles=[item["thumb_title"] for item in viewer["items"]],
+    )
+    cols = st.columns(thumb_cols)
+    for k, img in enumerate(thumbs):
+        cols[k % thumb_cols].image(img, use_container_width=True)
+
+
+def render_items(layout, items, label, view, render_cache, run_perf=None, job=None):
+    """items（diagram_items の一部）の木取図を描いてキャッシュに入れる（バックグラウンド用）"""
+    if view == VIEW_THUMBS:
+        render_thumbnails(layout, [item["sheet"] for item in items], label, SHEET_RENDERER, render_cache, run_perf,
+                          titles=[item["thumb_title"] for item in items])
+        return
+    for k, item in enumerate(items):
+        render_sheet_impl(layout, item["sheet"], label, SHEET_RENDERER, render_cache, run_perf, item["title"])
+        if job is not None:
+            job.report(rendered=k + 1)
+
+
+def prefetch_sheets(job, layout, items, label, view, render_cache):
+    """次のページの木取図を描いてキャッシュに入れておく（バックグラウンド）"""
+    render_items(layout, items, label, view, render_cache, job=job)
+
+
+# --- 木取りのバックグラウンド実行（trunktech.jobs） ---
+# 計算と木取図の描画は共有のスレッドプールで行い、画面は進み具合を JOB_POLL_SEC ごとに見に行く。
+# 同時に走る木取りは ITADORI_MAX_JOBS 件まで（それ以上は順番待ち）。
+# ボタンを押してから JOB_INLINE_WAIT 秒以内に終わった木取りは、待ち表示を出さずにそのまま結果を出す
+JOB_POLL_SEC = 0.5
+JOB_INLINE_WAIT = 0.3
+# 計算中に途中経過として見せる木取図の枚数
+JOB_PREVIEW_SHEETS = 3
+
+
+@st.cache_resource
+def get_job_manager():
+    """木取りジョブのスレッドプール（全セッションで共有）"""
+    return JobManager()
+
+
+# 次のページの先読みは木取りとは別の1本のスレッドで行う（先読みが木取りの同時実行数を使わないように）
+@st.cache_resource
+def get_prefetch_manager():
+    """木取図の先読みのスレッドプール（全セッションで共有・1件ずつ）"""
+    return JobManager(max_concurrent=1)
+
+
+def run_pack_job(job, all_parts, test_modes, kerf, opt_ms, prev, n_requested, pack_cache, render_cache,
+                 result_store, run_perf, offcut_material=None, inventory=None):
+    """バックグラウンドで木取りを計算し、最初のページの木取図を描いてキャッシュに入れる（st.* は使わない）。
+    prev は前回の結果のハンドル。offcut_material を渡すと、その材料の端材（inventory）に先に部品を置く。
+    戻り値: 結果を result_store に置いたハンドル"""
+    job.report(phase="pack", parts_placed=0, parts_total=n_requested, sheets=0)
+    used, parts = [], all_parts
+    if offcut_material is not None:
+        with run_perf.phase("offcuts"):
+            used, parts = pack_offcuts(TrunkTechEngine(kerf=kerf), all_parts, inventory, offcut_material)
+        run_perf.count("offcuts_used", len(used))
+    # 前回の結果と板・刃物厚が同じなら、変わった行の分だけ差分で置き直す（品質が落ちるなら全体を計算）。
+    # 差分が MAX_REBUILD_DEPTH 回続いたら全体を計算する（作り直すときにたどる回数を抑える）。
+    # 端材を使うときは、端材に置く部品が毎回変わるので差分にはしない
+    best = None
+    if (prev is not None and opt_ms == 0 and prev.get("kerf") == kerf and prev.get("boards") == test_modes
+            and prev["recipe"]["depth"] < MAX_REBUILD_DEPTH and offcut_material is None and "offcuts" not in prev):
+        with run_perf.phase("incremental"):
+            best = repack_result(result_store.resolve(prev), all_parts, kerf)
+        run_perf.count("incremental_hits" if best is not None else "incremental_misses")
+    if best is None:
+        # 板サイズ × 並べ順の全候補をプロセスプールで計算し、
+        # 全部品を配置できる結果を優先・その中で枚数優先・同枚数なら面積が小さい板を選択
+        with profiled("itadori-pack"):
+            best, _ = evaluate_candidates(
+                parts, test_modes, kerf, budget_ms=opt_ms, cache=pack_cache, perf=run_perf,
+                progress=lambda p: job.report(**p),
+            )
+    if offcut_material is not None:
+        best = attach_offcuts(best, used)
+        best["offcut_material"] = offcut_material
+    best["kerf"] = kerf
+    best["boards"] = test_modes
+    best["total_parts_requested"] = n_requested
+    layout = best["layout"]
+    items = diagram_items(layout, best["label"])
+    first_page = items[:SHEETS_PER_PAGE]
+    job.partial = {**best, "items": first_page}
+    job.report(phase="render", rendered=0, render_total=len(first_page), sheets=layout.sheet_count,
+               parts_placed=layout.part_count)
+    with run_perf.phase("render:job"):
+        render_items(layout, first_page, best["label"], VIEW_FULL, render_cache, run_perf, job)
+        if len(items) > SHEETS_PER_PAGE:
+            render_items(layout, first_page, best["label"], VIEW_THUMBS, render_cache, run_perf)
+    run_perf.count("sheets", layout.sheet_count)
+    with run_perf.phase("store"):
+        return result_store.put(best, make_recipe(best, parts, kerf, base=prev))
+
+
+def collect_pack_job():
+    """終わったジョブの結果を画面の状態に移す（計測の記録・ログもここで出す）"""
+    job = st.session_state.get("pack_job")
+    if job is None or not job.done:
+        return
+    del st.session_state["pack_job"]
+    run_perf, job_perf = st.session_state.pop("pack_job_perf", (None, None))
+    if job.status == "done":
+        st.session_state["diagram_result"] = job.result
+        if run_perf is not None:
+            run_perf.merge(job_perf)  # ジョブのスレッドは終わっているので、ここで足し込んでよい
+            st.session_state["last_perf"] = run_perf.as_dict()
+            print(
+                "itadori perf " + run_perf.log_line(board=job.result["label"], result_store=get_result_store().stats()),
+                file=sys.stderr, flush=True,
+            )
+    elif job.status == "cancelled":
+        st.session_state["job_message"] = ("info", "木取りを取り消しました。")
+    else:
+        st.session_state["job_message"] = ("error", f"木取りに失敗しました：{job.error}")
+
+
+# 読み込んだ切板リストは、まとめた後の種類数がこれ以下なら編集できる表に入れる（多いと表の描画が重い）
+EDITOR_MAX_ROWS = 2000
 
 
 # --- 3. UI メインエリア ---
@@ -314,6 +350,7 @@ st.markdown(
     unsafe_allow_html=True
 )
 st.write("定尺板から効率よく木取りを行うためのアプリです。")
+_startup_marks.append(("first_paint", time.perf_counter()))
 
 # 左寄せ・縦並び：設定 → 板材リスト。左カラム幅は CSS で 500px 固定（main_layout_500）
 with st.container(key="main_layout_500"):
@@ -347,18 +384,36 @@ with col_main:
         st.divider()
         size_choice = st.radio("板サイズの選定方法", ["自動選定 (効率優先)", "3x6固定", "4x8固定", "集成材"], key="size_choice")
         kerf = st.number_input("刃物厚 (mm)", value=3.0, step=0.1)
+        opt_ms = st.number_input(
+            "最適化の計算時間 (ms)", value=0, min_value=0, max_value=60000, step=500, key="opt_ms",
+            help="0 なら従来どおりの高速計算。指定した時間の範囲で並べ順を探索し、板枚数を減らします（下限に達したら早めに終了）。",
+        )
+
+        st.divider()
+        st.markdown("**■ 端材の在庫**")
+        use_offcuts = st.checkbox(
+            "在庫の端材を先に使う", key="use_offcuts",
+            help="新しい板を開ける前に、部品が入る在庫の端材へ置きます。確定すると、使った端材を在庫から出し、"
+                 "この木取りで出る端材（段の右端・板の上側の残り）を在庫に登録します。",
+        )
+        offcut_material = st.text_input("端材の材料名", value="合板", key="offcut_material",
+                                        help="同じ材料名の端材だけを使います（樹種・厚みで分けるときに変えてください）")
+        if use_offcuts:
+            st.caption(f"在庫：{offcut_material} の端材 {get_offcut_inventory().count(offcut_material)}枚")
 
     st.divider()
 
     # 2. 板材リストの入力（下）・4項目：名称｜幅｜奥行｜枚数
+    import pandas as pd  # 表を出すここで初めて読み込む（上の設定欄は先に表示される）
+    _startup_marks.append(("pandas", time.perf_counter()))
     st.subheader("切板リストの入力")
     if 'shelf_list' not in st.session_state:
         st.session_state.shelf_list = pd.DataFrame([
             {"名称": "部材名", "幅": 900.0, "奥行": 450.0, "枚数": 4},
         ])
     else:
-        # 旧カラム（巾(W), 奥行(D), 枚_数）を新4項目に移行
-        df = st.session_state.shelf_list.copy()
+        # 旧カラム（巾(W), 奥行(D), 枚_数）を新4項目に移行（読むだけなので、再実行のたびに表を複製しない）
+        df = st.session_state.shelf_list
         if "巾(W)" in df.columns or "奥行(D)" in df.columns or "枚_数" in df.columns:
             new_df = pd.DataFrame()
             new_df["名称"] = df["名称"] if "名称" in df.columns else ""
@@ -366,132 +421,314 @@ with col_main:
             new_df["奥行"] = df["奥行"] if "奥行" in df.columns else df["奥行(D)"]
             new_df["枚数"] = df["枚数"] if "枚数" in df.columns else df["枚_数"]
             st.session_state.shelf_list = new_df
-    shelf_df = st.data_editor(st.session_state.shelf_list, num_rows="dynamic", use_container_width=True, height="content", key="shelf_editor")
 
-    # --- 4. 木取り計算実行（ボタンは左カラム内） ---
-    if st.button("木取り図を作成する", use_container_width=True, key="btn_mokudori"):
-        all_parts = []
-        for _, row in shelf_df.iterrows():
-            qty = row.get("枚数", 0)
-            if pd.notna(row.get("名称")) and pd.notna(qty):
+    # CSV / Excel（CAD の出力など）から読み込む。ファイルはチャンクごとに読んで同じ部品をまとめる（trunktech.ingest）。
+    # まとめた後の行数が EDITOR_MAX_ROWS 以下なら表に入れて編集でき、それより多ければ表には出さずにそのまま使う
+    with st.expander("📄 CSV / Excel から読み込む"):
+        # 解除ボタンでファイルも外せるよう、ウィジェットのキーに世代番号を付ける（キーが変わると空のアップローダーになる）
+        cut_file = st.file_uploader(
+            "切板リストのファイル（列：名称・幅・奥行・枚数）", type=["csv", "xlsx", "xlsm"],
+            key=f"cutlist_file_{st.session_state.get('cutlist_file_gen', 0)}",
+        )
+        cut_encoding = st.selectbox("CSV の文字コード", ["utf-8-sig", "cp932"], key="cutlist_encoding",
+                                    help="Excel・CAD から Shift_JIS で出力した CSV は cp932")
+        if cut_file is not None:
+            file_key = (getattr(cut_file, "file_id", None) or cut_file.name, cut_file.size, cut_encoding)
+            if st.session_state.get("cutlist_file_key") != file_key:
                 try:
-                    n_qty = int(qty)
-                except (TypeError, ValueError):
-                    n_qty = 0
-                for i in range(n_qty):
-                    all_parts.append({"n": f"{row['名称']}", "w": float(row.get("幅", 0)), "d": float(row.get("奥行", 0))})
+                    with perf.phase("import"):
+                        imported = ingest_chunks(read_cut_list(cut_file, cut_file.name, cut_encoding))
+                except (ImportError, ValueError, UnicodeDecodeError) as e:
+                    st.error(f"ファイルを読み込めませんでした：{e}")
+                else:
+                    st.session_state.cutlist_file_key = file_key
+                    st.session_state.import_report = {
+                        "name": cut_file.name, "rows": imported["rows"], "groups": len(imported["counts"]),
+                        "rejected_count": imported["rejected_count"], "rejected": imported["rejected"],
+                    }
+                    if len(imported["counts"]) <= EDITOR_MAX_ROWS:
+                        st.session_state.shelf_list = result_frame(imported)
+                        st.session_state.pop("imported_parts", None)
+                        st.session_state.pop("shelf_editor", None)  # 表の編集内容は新しいリストで置き換える
+                    else:
+                        # 読み飛ばした行は import_report にあるので、部品の集計だけを残す
+                        st.session_state.imported_parts = {"counts": imported["counts"]}
+        report = st.session_state.get("import_report")
+        if report:
+            st.caption(f"{report['name']}：{report['rows']}行を読み込み、{report['groups']}種類の部品にまとめました。")
+            if report["rejected_count"]:
+                st.warning(f"{report['rejected_count']}行を読み飛ばしました（名称・寸法・枚数を確認してください）。")
+                st.dataframe(pd.DataFrame(report["rejected"]), use_container_width=True, hide_index=True)
+
+    imported = st.session_state.get("imported_parts")
+    if imported is not None:
+        st.info(f"読み込んだ {len(imported['counts'])}種類・{sum(imported['counts'].values())}個 の部品で木取りします（表が大きいため編集はできません）。")
+        st.dataframe(result_frame(imported).head(200), use_container_width=True, hide_index=True)
+        if st.button("読み込んだリストを解除して表に戻る", key="btn_clear_import"):
+            for k in ("imported_parts", "import_report", "cutlist_file_key"):
+                st.session_state.pop(k, None)
+            st.session_state.cutlist_file_gen = st.session_state.get("cutlist_file_gen", 0) + 1
+            st.rerun()
+        shelf_df = None
+    else:
+        shelf_df = st.data_editor(st.session_state.shelf_list, num_rows="dynamic", use_container_width=True, height="content", key="shelf_editor")
+
+    # --- 4. 木取り計算実行（ボタンは左カラム内） ---
+    packed = st.button("木取り図を作成する", use_container_width=True, key="btn_mokudori")
+    if packed:
+        # 板寸法は鼻切り分のみ控え（-2mm）。定尺は常に (長手, 短手) で渡す（trunktech.boards）
+        s36_dim = as_long_short(v36, h36, "3x6")
+        s48_dim = as_long_short(v48, h48, "4x8")
+        s_lam_dim = as_long_short(float(lam_l), float(lam_w), "集成材")
+        if "自動" in size_choice:
+            test_modes = [s36_dim, s48_dim, s_lam_dim]  # 自動選定＝3×6・4×8・集成材のうち効率の良いもの
+        elif "3x6" in size_choice:
+            test_modes = [s36_dim]
+        elif "4x8" in size_choice:
+            test_modes = [s48_dim]
+        elif "集成材" in size_choice:
+            test_modes = [s_lam_dim]
+
+        # 表を列ごとにまとめて検査し、(名称, 長辺, 短辺, 枚数) の部品リストにする（枚数分には展開しない）
+        with perf.phase("parse_input"):
+            ingested = ingest_frame(result_frame(imported) if imported is not None else shelf_df, test_modes)
+            all_parts = result_parts(ingested)
+        perf.count("input_rows", ingested["rows"])
+        perf.count("parts", sum(p["qty"] for p in all_parts))
+        if ingested["rejected_count"]:
+            st.warning(f"{ingested['rejected_count']}行を読み飛ばしました（名称・寸法・枚数を確認してください）。")
+            with st.expander("読み飛ばした行"):
+                st.dataframe(pd.DataFrame(ingested["rejected"]), use_container_width=True, hide_index=True)
+        if ingested["oversize_count"]:
+            st.warning(f"{ingested['oversize_count']}行の部品がどの定尺にも収まりません（配置されません）。")
+            with st.expander("定尺に収まらない部品"):
+                st.dataframe(pd.DataFrame(ingested["oversize"]), use_container_width=True, hide_index=True)
 
         if not all_parts:
             st.warning("棚板リストを入力してください。")
             if "diagram_result" in st.session_state:
                 del st.session_state["diagram_result"]
         else:
-            engine = TrunkTechEngine(kerf=kerf)
-            # 板寸法は鼻切り分のみ控え（-2mm）。定尺は常に (長手, 短手) で渡す
-            def as_long_short(a, b, lab):
-                lo, sh = max(a, b), min(a, b)
-                return (lo - 2, sh - 2, lab)
-            s36_dim = as_long_short(v36, h36, "3x6")
-            s48_dim = as_long_short(v48, h48, "4x8")
-            s_lam_dim = as_long_short(float(lam_l), float(lam_w), "集成材")
-            sim_results = []
-            if "自動" in size_choice:
-                test_modes = [s36_dim, s48_dim]  # 自動選定＝3×6 or 4×8 のどちらか効率の良い方
-            elif "3x6" in size_choice:
-                test_modes = [s36_dim]
-            elif "4x8" in size_choice:
-                test_modes = [s48_dim]
-            elif "集成材" in size_choice:
-                test_modes = [s_lam_dim]
-            n_requested = len(all_parts)
-            for vw, vh, label in test_modes:
-                sheets = engine.pack_sheets(all_parts, vw, vh)
-                total_placed = sum(len(r["parts"]) for s in sheets for r in s["rows"])
-                total_area = len(sheets) * (vw * vh)
-                sim_results.append({
-                    "label": label, "sheets": sheets, "sheet_count": len(sheets),
-                    "vw": vw, "vh": vh, "score": total_area,
-                    "total_parts_placed": total_placed,
-                })
-            # 全部品を配置できる結果を優先し、その中で枚数優先・同枚数なら面積が小さい板を選択
-            best = min(
-                sim_results,
-                key=lambda x: (
-                    0 if x["total_parts_placed"] == n_requested else 1,  # 全配置を最優先
-                    -x["total_parts_placed"],  # 多く配置できているほど良い
-                    x["sheet_count"],
-                    x["score"],
-                ),
+            n_requested = sum(p["qty"] for p in all_parts)
+            old_job = st.session_state.get("pack_job")
+            if old_job is not None:
+                old_job.cancel()  # 計算中にもう一度押されたら前の計算は取り消す
+            # ジョブは自分の PerfRecorder に書き、終わってから画面側の perf に足す（同じものを2つのスレッドで書かない）
+            job_perf = PerfRecorder("mokudori")
+            job = get_job_manager().submit(
+                run_pack_job, all_parts, test_modes, kerf, opt_ms, st.session_state.get("diagram_result"),
+                n_requested, get_pack_cache(), get_render_cache(), get_result_store(), job_perf,
+                offcut_material if use_offcuts else None, get_offcut_inventory(), label="mokudori",
             )
-            best["total_parts_requested"] = n_requested
-            st.session_state["diagram_result"] = best
-
+            st.session_state["pack_job"] = job
+            st.session_state["pack_job_perf"] = (perf, job_perf)
+            st.session_state.pop("job_message", None)
+            job.wait(JOB_INLINE_WAIT)
+
+    collect_pack_job()
+    if "job_message" in st.session_state:
+        kind, message = st.session_state["job_message"]
+        (st.info if kind == "info" else st.error)(message)
+
+    if "pack_job" in st.session_state:
+        @st.fragment(run_every=JOB_POLL_SEC)
+        def pack_job_progress():
+            """計算中の進み具合・取り消しボタン・描けた木取図（この部分だけ JOB_POLL_SEC ごとに再実行）"""
+            job = st.session_state.get("pack_job")
+            if job is None:
+                return
+            if job.done:
+                st.rerun()  # 画面全体を描き直して結果を出す
+            p = job.progress
+            if job.status == "queued":
+                st.info("他の木取りが終わるのを待っています…")
+            elif p.get("phase") == "render":
+                st.progress(
+                    p["rendered"] / max(p["render_total"], 1),
+                    text=f"木取図を描いています… {p['rendered']} / {p['render_total']}枚（全{p['sheets']}枚）",
+                )
+            else:
+                total = max(p.get("parts_total", 0), 1)
+                st.progress(
+                    min(p.get("parts_placed", 0) / total, 1.0),
+                    text=f"木取り計算中… 候補 {p.get('candidates_done', 0)} / {p.get('candidates', '-')}"
+                         f"・部品 {p.get('parts_placed', 0)} / {total}個・板 {p.get('sheets', 0)}枚"
+                         f"（{job.elapsed():.1f}秒）",
+                )
+            if st.button("⏹ 計算を取り消す", key="btn_cancel_job", use_container_width=True):
+                job.cancel()
+            partial = job.partial
+            if partial is not None and p.get("rendered"):
+                layout = partial["layout"]
+                for item in partial["items"][:min(p["rendered"], JOB_PREVIEW_SHEETS)]:
+                    img = render_sheet_impl(layout, item["sheet"], partial["label"], SHEET_RENDERER, get_render_cache(),
+                                            title=item["title"])
+                    st.image(img, use_container_width=True)
+
+        pack_job_progress()
+
+    # 結果はハンドルから取り出す（置き場から捨てられていれば計算し直す）
+    best = viewer = None
     if "diagram_result" in st.session_state:
-        best = st.session_state["diagram_result"]
+        with perf.phase("resolve_result"):
+            best = get_result_store().resolve(st.session_state["diagram_result"])
+
+    if best is not None:
         total_placed = best.get("total_parts_placed", 0)
         total_req = best.get("total_parts_requested", total_placed)
-        st.success(f"💡 木取り完了：**{best['label']}板** を **{best['sheet_count']}枚** 使用し、**{total_placed}個** の部品を配置しました。")
+        with perf.phase("patterns"):
+            items = diagram_items(best["layout"], best["label"])
+        offcuts = best.get("offcuts", ())
+        if offcuts:
+            on_offcuts = sum(o["layout"].part_count for o in offcuts)
+            st.success(
+                f"💡 木取り完了：端材 **{len(offcuts)}枚** に **{on_offcuts}個**、**{best['label']}板** を "
+                f"**{best['sheet_count']}枚** 使用し、合わせて **{total_placed}個** の部品を配置しました。"
+            )
+        else:
+            st.success(f"💡 木取り完了：**{best['label']}板** を **{best['sheet_count']}枚** 使用し、**{total_placed}個** の部品を配置しました。")
+        if len(items) < best["sheet_count"]:
+            # 同じ並びの板が繰り返すときは、パターンごとの枚数をまとめて出す（木取図・印刷もパターンごと）
+            with st.expander(f"木取りパターン：{len(items)}種類（同じ並びの板をまとめて表示・印刷します）"):
+                st.table({
+                    "パターン": [pattern_name(k) for k in range(len(items))],
+                    "枚数": [len(item["sheets"]) for item in items],
+                    "板ID": [format_ids(item["sheets"]) for item in items],
+                    "部品数/枚": [best["layout"].sheet_part_count(item["sheet"]) for item in items],
+                })
+        if "optimize" in best:
+            opt = best["optimize"]
+            st.caption(
+                f"最適化：板枚数の下限 {opt['lower_bound']}枚 ／ 最良 {opt['sheet_count']}枚"
+                f"（通常計算 {opt['greedy_sheet_count']}枚）／ 計算時間 {opt['elapsed_ms']:.0f} ms"
+            )
+        if "incremental" in best:
+            inc = best["incremental"]
+            st.caption(
+                f"変更分だけ再計算：板 {inc['sheets_kept']}枚はそのまま、{inc['sheets_released']}枚分を置き直し"
+                f"（部品 +{inc['added']} / −{inc['removed']}）"
+            )
+        if "offcut_material" in best:
+            # 確定するまで在庫は変えない（同じ端材を別の木取りでも使えるように計算だけしておける）
+            handle = st.session_state["diagram_result"]
+            if "offcuts_committed" in handle:
+                st.caption(f"確定済み：この木取りで出た端材 {handle['offcuts_committed']}枚を在庫に登録しました。")
+            elif st.button("✅ この木取りで確定（端材の在庫を更新）", use_container_width=True, key="btn_offcuts_commit"):
+                added = claim_and_record(get_offcut_inventory(), best["offcut_material"], best,
+                                         source=time.strftime("%Y-%m-%d %H:%M"))
+                if added is None:
+                    st.error("使う予定の端材が他の木取りで使われました。もう一度「木取り図を作成する」を押してください。")
+                else:
+                    handle["offcuts_committed"] = added
+                    used_note = f"端材 {len(offcuts)}枚を在庫から出し、" if offcuts else ""
+                    st.success(f"{used_note}新しい端材 {added}枚を在庫に登録しました。")
+            if offcuts:
+                with st.expander(f"端材の木取図（{len(offcuts)}枚）"):
+                    for o in offcuts:
+                        st.image(render_sheet(o["layout"], 0, best["label"], offcut_title(o)), use_container_width=True)
         if total_req > 0 and total_placed < total_req:
             st.warning("一部の部品は定尺に収まらなかったため配置していません。板サイズを大きくするか、部品寸法を確認してください。")
-        # A4に3枚/ページの印刷用HTMLダウンロード
-        print_html = build_print_html(best)
+        # A4の印刷用HTMLダウンロード。HTMLはボタンを押したときに初めて作る（再実行のたびには作らない）
+        per_page = st.number_input("印刷：1ページあたりの木取図の枚数", value=1, min_value=1, max_value=6, step=1, key="print_per_page")
+        render_cache = get_render_cache()
         st.download_button(
             "🖨️ 木取図を印刷用にダウンロード（A4）",
-            data=print_html,
+            data=lambda: write_print_download(best, per_page, render_cache),
             file_name="mokudori_print.html",
             mime="text/html",
             use_container_width=True,
             key="btn_print_dl"
         )
+        # パネルソー・CAD 用（パターンごとの切断手順 CSV・DXF）。これもボタンを押したときに作る
+        c_cuts, c_dxf = st.columns(2)
+        c_cuts.download_button(
+            "📋 切断手順（CSV）", data=lambda: write_export_download("cuts", best), file_name="mokudori_cuts.csv",
+            mime="text/csv", use_container_width=True, key="btn_cuts_dl",
+        )
+        c_dxf.download_button(
+            "📐 木取図（DXF）", data=lambda: write_export_download("dxf", best), file_name="mokudori.dxf",
+            mime="application/dxf", use_container_width=True, key="btn_dxf_dl",
+        )
+
+        # 木取図のページ送り・表示方法（右カラム・スマホ表示の両方に効く）
+        n_items = len(items)
+        n_pages = -(-n_items // SHEETS_PER_PAGE)
+        view = st.radio("木取図の表示", [VIEW_THUMBS, VIEW_FULL], index=0 if n_pages > 1 else 1,
+                        horizontal=True, key="sheet_view")
+        page = 1
+        if n_pages > 1:
+            if st.session_state.get("sheet_page", 1) > n_pages:
+                st.session_state["sheet_page"] = n_pages  # 前の結果より板が減ったとき
+            page = st.number_input(f"ページ（全{n_pages}ページ）", min_value=1, max_value=n_pages, step=1, key="sheet_page")
+        first = (page - 1) * SHEETS_PER_PAGE
+        page_items = list(range(first, min(first + SHEETS_PER_PAGE, n_items)))
+        unit = "枚" if n_items == best["sheet_count"] else "パターン"
+        if page_items:  # 全部の部品が端材に収まったときは新しい板の木取図はない
+            st.caption(f"木取図 {first + 1}〜{page_items[-1] + 1}{unit}目 ／ 全{n_items}{unit}")
+        focus = None
+        if view == VIEW_THUMBS:
+            if st.session_state.get("sheet_focus") not in page_items:
+                st.session_state.pop("sheet_focus", None)
+            focus = st.selectbox(
+                "原寸で表示する木取図", page_items, key="sheet_focus",
+                format_func=lambda k: items[k]["thumb_title"] or f"ID:{items[k]['sheet'] + 1}",
+            )
+        viewer = {
+            "view": view, "items": [items[k] for k in page_items], "focus": None if focus is None else items[focus],
+            "page": page, "pages": n_pages, "next": items[first + SHEETS_PER_PAGE:first + 2 * SHEETS_PER_PAGE],
+        }
 
 # 大画面時：右カラムに木取図を表示（スマホでは従来どおり下に表示される）
-if "diagram_result" in st.session_state:
-    best = st.session_state["diagram_result"]
+if best is not None:
     with col_right:
         st.subheader("🪚 木取図")
-        for s in best["sheets"]:
-            fig, ax = plt.subplots(figsize=(8, 4))
-            v_w_full, v_h_full = best["vw"] + 2, best["vh"] + 2
-            ax.set_xlim(0, v_w_full); ax.set_ylim(0, v_h_full); ax.set_aspect('equal')
-            ax.add_patch(patches.Rectangle((0,0), v_w_full, v_h_full, fc='#fdf5e6', ec='#8b4513', lw=2))
-            kw_t = {"fontsize": 12, "fontweight": "bold"}
-            if _jp_font is not None:
-                kw_t["fontproperties"] = _jp_font
-            ax.set_title(f"【木取り図】 ID:{s['id']} ({best['label']}：{int(v_w_full)}x{int(v_h_full)})", **kw_t)
-            kw_txt = {"ha": "center", "va": "center", "fontsize": 8, "fontweight": "bold"}
-            if _jp_font is not None:
-                kw_txt["fontproperties"] = _jp_font
-            for r in s['rows']:
-                for p in r['parts']:
-                    ax.add_patch(patches.Rectangle((p['x'],p['y']), p['w'], p['h'], lw=1, ec='black', fc='#deb887', alpha=0.8))
-                    ax.text(p['x']+p['w']/2, p['y']+p['h']/2, f"{p['n']}\n{int(p['w'])}x{int(p['h'])}", **kw_txt)
-            st.pyplot(fig)
-            plt.close(fig)
+        with perf.phase("render:right"):
+            show_sheets(best, viewer, thumb_cols=2)
 else:
     # 木取図なし時は従来どおり右は空欄（背景が見える）
     with col_right:
         pass
 
 # スマホ用：木取図を縦並びの下に表示（大画面では CSS で非表示・右カラムで表示）
-if "diagram_result" in st.session_state:
-    best = st.session_state["diagram_result"]
+if best is not None:
     with st.container(key="mokudori_mobile"):
         st.subheader("🪚 木取り図")
-        for s in best["sheets"]:
-            fig, ax = plt.subplots(figsize=(10, 5))
-            v_w_full, v_h_full = best["vw"] + 2, best["vh"] + 2
-            ax.set_xlim(0, v_w_full); ax.set_ylim(0, v_h_full); ax.set_aspect('equal')
-            ax.add_patch(patches.Rectangle((0,0), v_w_full, v_h_full, fc='#fdf5e6', ec='#8b4513', lw=2))
-            kw_t2 = {"fontsize": 12, "fontweight": "bold"}
-            if _jp_font is not None:
-                kw_t2["fontproperties"] = _jp_font
-            ax.set_title(f"【木取り図】 ID:{s['id']} ({best['label']}：{int(v_w_full)}x{int(v_h_full)})", **kw_t2)
-            kw_txt2 = {"ha": "center", "va": "center", "fontsize": 9, "fontweight": "bold"}
-            if _jp_font is not None:
-                kw_txt2["fontproperties"] = _jp_font
-            for r in s['rows']:
-                for p in r['parts']:
-                    ax.add_patch(patches.Rectangle((p['x'],p['y']), p['w'], p['h'], lw=1, ec='black', fc='#deb887', alpha=0.8))
-                    ax.text(p['x']+p['w']/2, p['y']+p['h']/2, f"{p['n']}\n{int(p['w'])}x{int(p['h'])}", **kw_txt2)
-            st.pyplot(fig)
-            plt.close(fig)
\ No newline at end of file
+        with perf.phase("render:mobile"):
+            show_sheets(best, viewer, thumb_cols=3)
+
+    # 次のページの図を先読みする（同じページ・表示方法では1回だけ）
+    if viewer["page"] < viewer["pages"]:
+        prefetch_key = (st.session_state["diagram_result"]["key"], viewer["page"] + 1, viewer["view"])
+        if st.session_state.get("sheet_prefetched") != prefetch_key:
+            st.session_state["sheet_prefetched"] = prefetch_key
+            old_prefetch = st.session_state.get("prefetch_job")
+            if old_prefetch is not None:
+                old_prefetch.cancel()  # 読み終わっていない前のページの先読みはもう要らない
+            st.session_state["prefetch_job"] = get_prefetch_manager().submit(
+                prefetch_sheets, best["layout"], viewer["next"], best["label"], viewer["view"], get_render_cache(),
+                label="prefetch",
+            )
+
+# 処理時間の内訳：木取りを計算した回の計測（collect_pack_job で残したもの）を左カラムの下に表示する
+if "last_perf" in st.session_state:
+    last = st.session_state["last_perf"]
+    with col_main:
+        with st.expander(f"処理時間の内訳（前回の計算：{last['total_ms']:.0f} ms）"):
+            st.table({"区間": list(last["phases"]), "時間 (ms)": list(last["phases"].values())})
+            st.table({"件数": list(last["counters"]), "値": list(last["counters"].values())})
+
+# 起動・再実行の時間計測の表示（ITADORI_STARTUP_REPORT=1 のときだけ）
+if STARTUP_REPORT:
+    _startup_marks.append(("end", time.perf_counter()))
+    steps = []
+    prev = _startup_t0
+    for name, t in _startup_marks:
+        steps.append(f"{name}={(t - prev) * 1000:.1f}ms")
+        prev = t
+    report = (
+        f"itadori startup: total={(prev - _startup_t0) * 1000:.1f}ms " + " ".join(steps)
+        + f" matplotlib_loaded={'matplotlib' in sys.modules} pandas_loaded={'pandas' in sys.modules}"
+    )
+    print(report, file=sys.stderr)
+    with st.expander("起動・再実行の時間（計測）"):
+        st.code(report.replace(" ", "\n"))
@@ -1,5 +1,11 @@
 # Streamlit 共通ユーティリティ（イタドリ・判じ図などで共有）
 # テーブル・データエディタの白背景問題の共通対策
+# 背景画像テーマ（画像の読み込み・エンコードはプロセスで1回だけ）
+
+import base64
+import functools
+import io
+import os
 
 STREAMLIT_TABLE_WHITE_BG_CSS = """
 <style>
@@ -52,3 +58,73 @@ def inject_table_white_bg(st):
     if not hasattr(st, "markdown") or not callable(getattr(st, "markdown")):
         return
     st.markdown(STREAMLIT_TABLE_WHITE_BG_CSS, unsafe_allow_html=True)
+
+
+
+# 背景画像を data URI で埋め込むときの最大幅（これより大きい画像は縮小する）
+BACKGROUND_MAX_WIDTH = 1920
+
+
+@functools.lru_cache(maxsize=8)
+def _background_data_uri(path, mtime, max_width):
+    """画像ファイルを（可能なら縮小・WebP 化して）data URI にする。mtime はファイル更新時の作り直し用。"""
+    with open(path, "rb") as f:
+        data = f.read()
+    mime = "image/png" if path.lower().endswith(".png") else "image/jpeg"
+    try:
+        from PIL import Image
+
+        img = Image.open(io.BytesIO(data))
+        if img.width > max_width:
+            img = img.resize((max_width, round(img.height * max_width / img.width)))
+        buf = io.BytesIO()
+        img.save(buf, format="WEBP", quality=80)
+        if buf.tell() < len(data):
+            data, mime = buf.getvalue(), "image/webp"
+    except Exception:
+        pass  # Pillow が無い・変換できない場合は元の画像をそのまま使う
+    return f"data:{mime};base64,{base64.b64encode(data).decode()}"
+
+
+def background_image_url(st, image_path, max_width=BACKGROUND_MAX_WIDTH):
+    """背景画像の URL を返す。見つからなければ None。
+    静的ファイル配信（server.enableStaticServing）が有効で、画像がアプリの static/ にあれば
+    "app/static/..." の URL を返す（ブラウザがキャッシュするので再実行ごとの転送が無い）。
+    それ以外は data URI（エンコード結果はプロセス内でキャッシュ）。"""
+    if not os.path.exists(image_path):
+        return None
+    parent = os.path.basename(os.path.dirname(os.path.abspath(image_path)))
+    try:
+        static = parent == "static" and st.get_option("server.enableStaticServing")
+    except Exception:
+        static = False
+    if static:
+        return "app/static/" + os.path.basename(image_path)
+    return _background_data_uri(os.path.abspath(image_path), os.path.getmtime(image_path), max_width)
+
+
+@functools.lru_cache(maxsize=8)
+def _background_css(image_url, extra_css):
+    return f"""
+<style>
+.stApp {{
+    background-image: url("{image_url}");
+    background-size: cover;
+    background-position: center;
+    background-attachment: fixed;
+}}
+{extra_css}
+</style>
+"""
+
+
+def inject_background_theme(st, image_path, extra_css=""):
+    """背景画像と追加の CSS を適用する（画像が無ければ何もしない）。
+    CSS 文字列は画像 URL と extra_css ごとに1回だけ組み立てる。
+    Streamlit は再実行で出力されなかった要素を消すため、呼び出しは毎回必要。"""
+    if not hasattr(st, "markdown") or not callable(getattr(st, "markdown")):
+        return
+    url = background_image_url(st, image_path)
+    if url is None:
+        return
+    st.markdown(_background_css(url, extra_css), unsafe_allow_html=True)
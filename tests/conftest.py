@@ -0,0 +1,8 @@
+# tests から trunktech を import できるようにする（benchmarks/bench.py と同じくリポジトリの直下を sys.path に入れる）
+
+import os
+import sys
+
+_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _root not in sys.path:
+    sys.path.insert(0, _root)
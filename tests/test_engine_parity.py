@@ -0,0 +1,97 @@
+# TrunkTechEngine.pack_sheets が、索引を入れる前の配置（1個ずつ全板・全段を走査する first-fit）と
+# 同じ結果を返すことを確かめる。_baseline_pack_sheets は元の pack_sheets の写し（変更しないこと）。
+#   python -m pytest tests/test_engine_parity.py
+
+import random
+
+import pytest
+
+from trunktech import TrunkTechEngine
+
+BOARDS = ((1818, 908), (2438, 1218), (3598, 498))
+KERFS = (0, 2.5, 3.0)
+
+
+def _baseline_pack_sheets(parts, vw, vh, kerf):
+    """索引を入れる前の TrunkTechEngine.pack_sheets（部品は1個ずつ、枚数 qty は使わない）"""
+    normalized = []
+    for p in parts:
+        w, d = p["w"], p["d"]
+        normalized.append({**p, "w": max(w, d), "d": min(w, d)})
+    valid = [p for p in normalized if p["w"] <= vw and p["d"] <= vh]
+    sorted_parts = sorted(valid, key=lambda x: (x["w"], x["d"]), reverse=True)
+    sheets = []
+
+    def pack(p):
+        for s in sheets:
+            for r in s["rows"]:
+                if r["h"] >= p["d"] and (vw - r["used_w"]) >= p["w"]:
+                    r["parts"].append({"n": p["n"], "x": r["used_w"], "y": r["y"], "w": p["w"], "h": p["d"]})
+                    r["used_w"] += p["w"] + kerf
+                    return True
+            if (vh - s["used_h"]) >= p["d"]:
+                s["rows"].append({
+                    "y": s["used_h"], "h": p["d"], "used_w": p["w"] + kerf,
+                    "parts": [{"n": p["n"], "x": 0, "y": s["used_h"], "w": p["w"], "h": p["d"]}],
+                })
+                s["used_h"] += p["d"] + kerf
+                return True
+        return False
+
+    for p in sorted_parts:
+        if not pack(p):
+            if p["w"] <= vw and p["d"] <= vh:
+                sheets.append({
+                    "id": len(sheets) + 1,
+                    "used_h": p["d"] + kerf,
+                    "rows": [{
+                        "y": 0, "h": p["d"], "used_w": p["w"] + kerf,
+                        "parts": [{"n": p["n"], "x": 0, "y": 0, "w": p["w"], "h": p["d"]}],
+                    }],
+                })
+    return sheets
+
+
+def _gen_groups(rng, kind):
+    """同寸法をまとめた切板リスト [{"n", "w", "d", "qty"}]"""
+    if kind == "repeated":  # 少ない寸法を大量に（板の複製が起きる）
+        sizes = [(rng.choice([1800, 900, 600, 450]), rng.choice([450, 300, 250])) for _ in range(3)]
+        return [{"n": f"p{i}", "w": w, "d": d, "qty": rng.randint(1, 300)} for i, (w, d) in enumerate(sizes)]
+    if kind == "unique":
+        return [{"n": f"p{i}", "w": rng.randint(50, 1800), "d": rng.randint(30, 900), "qty": rng.randint(1, 3)}
+                for i in range(rng.randint(1, 300))]
+    if kind == "near_board":  # 定尺いっぱい・定尺超えを含む
+        return [{"n": f"p{i}", "w": rng.randint(1500, 1900), "d": rng.randint(400, 950), "qty": rng.randint(1, 4)}
+                for i in range(rng.randint(1, 60))]
+    # 小数の寸法（段高さの種類が多い）。名前は重複させる
+    return [{"n": f"p{i % 7}", "w": round(rng.uniform(10, 1900), 1), "d": round(rng.uniform(10, 950), 1),
+             "qty": rng.randint(1, 5)} for i in range(rng.randint(1, 200))]
+
+
+def _expand(groups):
+    return [{"n": g["n"], "w": g["w"], "d": g["d"]} for g in groups for _ in range(g["qty"])]
+
+
+CASES = [(kind, seed) for kind in ("repeated", "unique", "near_board", "fractional") for seed in range(15)]
+
+
+@pytest.mark.parametrize("kind,seed", CASES)
+def test_pack_sheets_matches_baseline(kind, seed):
+    rng = random.Random(f"{kind}-{seed}")
+    groups = _gen_groups(rng, kind)
+    vw, vh = rng.choice(BOARDS)
+    kerf = rng.choice(KERFS)
+    parts = _expand(groups)
+    expected = _baseline_pack_sheets(parts, vw, vh, kerf)
+    # 1個ずつのリストでも、枚数 qty でまとめたリストでも同じ配置になる
+    assert TrunkTechEngine(kerf).pack_sheets(parts, vw, vh) == expected
+    assert TrunkTechEngine(kerf).pack_sheets(groups, vw, vh) == expected
+
+
+def test_pack_sheets_matches_baseline_rotated_and_oversize():
+    """縦横を入れ替えて入力した部品・定尺を超える部品（配置しない）"""
+    rng = random.Random(99)
+    parts = [{"n": f"r{i}", "w": rng.randint(30, 950), "d": rng.randint(50, 2000)} for i in range(300)]
+    for kerf in KERFS:
+        expected = _baseline_pack_sheets(parts, 1818, 908, kerf)
+        assert TrunkTechEngine(kerf).pack_sheets(parts, 1818, 908) == expected
@@ -0,0 +1,56 @@
+# パネルソー用の出力（user-021）：切断手順 CSV は並び（パターン）ごとに1つ・板 ID と枚数が合うこと、
+# DXF は R12 の表（線種・文字スタイル・画層）がそろい、パターンごとに部品の長方形があること。
+#   python -m pytest tests/test_export.py
+
+import csv
+import io
+import random
+
+from trunktech import evaluate_candidates, iter_cut_csv, iter_dxf, write_export
+from trunktech.export import CUT_COLUMNS
+
+
+def _best(seed=11):
+    rng = random.Random(seed)
+    parts = [{"n": f"P{i}", "w": rng.randint(200, 900), "d": rng.randint(80, 400), "qty": rng.randint(1, 6)}
+             for i in range(30)]
+    best, _ = evaluate_candidates(parts, [(1818, 908, "3x6")], 3.0, workers=1)
+    return best
+
+
+def _dxf_pairs(text):
+    lines = text.splitlines()
+    return [(int(lines[i]), lines[i + 1]) for i in range(0, len(lines) - 1, 2)]
+
+
+def test_cut_csv_has_one_program_per_pattern():
+    best = _best()
+    rows = list(csv.DictReader(io.StringIO("".join(iter_cut_csv(best)))))
+    assert tuple(rows[0].keys()) == CUT_COLUMNS
+    patterns = best["layout"].patterns()
+    repeats = {}
+    for r in rows:
+        repeats[r["pattern"]] = int(r["repeat"])
+    assert len(repeats) == len(patterns)
+    assert sum(repeats.values()) == best["layout"].sheet_count
+    for r in rows:
+        assert r["cut"] in ("rip", "cross", "trim")
+
+
+def test_dxf_is_self_consistent_r12():
+    best = _best()
+    data = write_export(iter_dxf(best), io.BytesIO(), "cp932").getvalue()
+    pairs = _dxf_pairs(data.decode("cp932"))
+    names = [v for c, v in pairs if c == 9]
+    assert ("1", "AC1009") in [(str(c), v) for c, v in pairs]
+    assert "$INSUNITS" not in names  # R12 には無い変数
+    sections = [v for c, v in pairs if c == 0 and v in ("SECTION", "ENDSEC")]
+    assert sections == ["SECTION", "ENDSEC"] * 3 and pairs[-1] == (0, "EOF")
+    tables = [pairs[i + 1][1] for i, p in enumerate(pairs) if p == (0, "TABLE")]
+    assert tables == ["LTYPE", "STYLE", "LAYER"]
+    defined = {pairs[i + 1][1] for i, p in enumerate(pairs) if p == (0, "LTYPE")}
+    used = {v for c, v in pairs if c == 6}
+    assert used <= defined
+    part_rects = sum(1 for i, p in enumerate(pairs) if p == (0, "POLYLINE") and pairs[i + 1] == (8, "PARTS"))
+    layout = best["layout"]
+    assert part_rects == sum(len(list(layout.parts(group[0]))) for group in layout.patterns())
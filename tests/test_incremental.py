@@ -0,0 +1,58 @@
+# 差分の再計算（user-015）：小さな変更は前回の板を残して置き直し、
+# 板枚数が下限から前回より離れるとき・変更が多すぎるときは None を返して全体の計算に任せること。
+#   python -m pytest tests/test_incremental.py
+
+import random
+
+from trunktech import TrunkTechEngine, evaluate_candidates
+from trunktech.incremental import layout_counts, repack_result
+
+BOARD = [(1818, 908, "3x6")]
+
+
+def _counts(parts):
+    out = {}
+    for p in parts:
+        key = (p["n"], float(max(p["w"], p["d"])), float(min(p["w"], p["d"])))
+        out[key] = out.get(key, 0) + p["qty"]
+    return {k: q for k, q in out.items() if q}
+
+
+def _layout_counts(layout):
+    return {(n, float(w), float(d)): q for (n, w, d), q in layout_counts(layout).items()}
+
+
+def test_small_edit_is_repacked_incrementally():
+    rng = random.Random(7)
+    parts = [{"n": f"P{i}", "w": rng.randint(200, 900), "d": rng.randint(80, 400), "qty": rng.randint(1, 4)}
+             for i in range(80)]
+    prev, _ = evaluate_candidates(parts, BOARD, 3.0, orders=("wd",), workers=1)
+    edited = [dict(p) for p in parts]
+    edited[10]["qty"] -= 1
+    edited.append({"n": "追加", "w": 300, "d": 200, "qty": 1})
+    result = repack_result(prev, edited, 3.0)
+    assert result is not None
+    info = result["incremental"]
+    assert info["accepted"] and info["removed"] == 1 and info["added"] == 1
+    assert info["sheets_kept"] > 0 and info["sheets_touched"] == 1
+    assert result["sheet_count"] <= prev["sheet_count"] + 1
+    assert _layout_counts(result["layout"]) == _counts(edited)  # 部品の過不足が無い
+
+
+def test_falls_back_when_quality_drops():
+    # 8枚の板にそれぞれ別の部品 4個。各板から1個ずつ抜くと、どの板にも 900x450 の穴が残り、
+    # 増やした 1800x450 はどの穴にも入らない → 差分では 9枚以上、全体を計算すれば 8枚
+    parts = [{"n": f"p{i}", "w": 900, "d": 450, "qty": 4} for i in range(8)]
+    prev, _ = evaluate_candidates(parts, BOARD, 0, orders=("wd",), workers=1)
+    assert prev["sheet_count"] == 8
+    edited = [{"n": f"p{i}", "w": 900, "d": 450, "qty": 3} for i in range(8)]
+    edited.append({"n": "L", "w": 1800, "d": 450, "qty": 4})
+    assert repack_result(prev, edited, 0, min_utilization=0, max_changed_ratio=1) is None
+    assert TrunkTechEngine(kerf=0).pack_layout(edited, 1818, 908).sheet_count == 8
+
+
+def test_falls_back_when_too_much_changed():
+    parts = [{"n": f"p{i}", "w": 600, "d": 300, "qty": 2} for i in range(10)]
+    prev, _ = evaluate_candidates(parts, BOARD, 3.0, workers=1)
+    edited = [{"n": f"q{i}", "w": 600, "d": 300, "qty": 2} for i in range(10)]  # 名前が全部変わった
+    assert repack_result(prev, edited, 3.0) is None
@@ -0,0 +1,53 @@
+# 切板リストの取り込み（user-016）：読み飛ばす行の理由・長辺/短辺の並べ替え・同じ部品のまとめ・定尺超え。
+#   python -m pytest tests/test_ingest.py
+
+import math
+
+import pandas as pd
+import pytest
+
+from trunktech.ingest import MAX_QTY, ingest_chunks, ingest_frame, normalize_frame, result_parts
+
+
+@pytest.mark.parametrize("row,reason", [
+    ({"名称": "", "幅": 900, "奥行": 450, "枚数": 1}, "name"),
+    ({"名称": "A", "幅": "abc", "奥行": 450, "枚数": 1}, "dims"),
+    ({"名称": "A", "幅": 0, "奥行": 450, "枚数": 1}, "nonpositive"),
+    ({"名称": "A", "幅": math.inf, "奥行": 450, "枚数": 1}, "dims_inf"),
+    ({"名称": "A", "幅": 900, "奥行": 450, "枚数": None}, "qty"),
+    ({"名称": "A", "幅": 900, "奥行": 450, "枚数": math.inf}, "qty_large"),
+    ({"名称": "A", "幅": 900, "奥行": 450, "枚数": MAX_QTY + 1}, "qty_large"),
+    ({"名称": "A", "幅": 900, "奥行": 450, "枚数": 2.5}, "qty_int"),
+    ({"名称": "A", "幅": 900, "奥行": 450, "枚数": -1}, "qty_negative"),
+    ({"名称": "A", "幅": 900, "奥行": 450, "枚数": MAX_QTY}, ""),
+])
+def test_reject_reasons(row, reason):
+    frame = normalize_frame(pd.DataFrame([row]))
+    assert frame["reason"].tolist() == [reason]
+    if reason:
+        assert frame["qty"].tolist() == [0]
+
+
+def test_groups_rows_and_reports_rejects_and_oversize():
+    df = pd.DataFrame({
+        "name": ["A", "A", "B", "C", "D", "E"],
+        "width": ["450", 900, 600, 5000, 300, 300],
+        "depth": [900, "450", 300, 300, 200, 200],
+        "quantity": [1, 2, 0, 1, "x", 1],
+    })
+    result = ingest_frame(df, boards=[(1818, 908, "3x6")])
+    assert result["rows"] == 6
+    assert result["counts"] == {("A", 900.0, 450.0): 3, ("C", 5000.0, 300.0): 1, ("E", 300.0, 200.0): 1}
+    assert result["rejected_count"] == 1 and result["rejected"][0]["行"] == 5
+    assert result["oversize_count"] == 1 and result["oversize"][0]["名称"] == "C"
+    assert result_parts(result)[0] == {"n": "A", "w": 900.0, "d": 450.0, "qty": 3}
+
+
+def test_chunks_add_up_with_row_numbers():
+    chunks = [
+        pd.DataFrame({"名称": ["A", ""], "幅": [900, 900], "奥行": [450, 450], "枚数": [1, 1]}),
+        pd.DataFrame({"名称": ["A", "B"], "幅": [900, 300], "奥行": [450, 200], "枚数": [2, 2.5]}),
+    ]
+    result = ingest_chunks(chunks)
+    assert result["counts"] == {("A", 900.0, 450.0): 3}
+    assert [r["行"] for r in result["rejected"]] == [2, 4]
@@ -0,0 +1,46 @@
+# 端材の在庫（user-022）：先に端材へ置き、確定（claim_and_record）で使った端材が消えて新しい端材が増えること。
+#   python -m pytest tests/test_offcuts.py
+
+from trunktech import TrunkTechEngine, evaluate_candidates
+from trunktech.offcuts import OffcutInventory, attach_offcuts, claim_and_record, offcuts_of, pack_offcuts
+
+BOARD = [(1818, 908, "3x6")]
+
+
+def _job(inventory, material="合板"):
+    parts = [{"n": "棚板", "w": 850, "d": 400, "qty": 3}, {"n": "側板", "w": 1700, "d": 450, "qty": 2}]
+    used, rest = pack_offcuts(TrunkTechEngine(kerf=3.0), parts, inventory, material)
+    best, _ = evaluate_candidates(rest, BOARD, 3.0, workers=1)
+    return attach_offcuts(best, used), used
+
+
+def test_offcuts_are_used_before_new_boards():
+    inventory = OffcutInventory(":memory:")
+    inventory.add("合板", [(900, 420), (1750, 460)])
+    best, used = _job(inventory)
+    assert len(used) == 2
+    assert best["total_parts_placed"] == 5
+    assert sum(o["layout"].part_count for o in used) == 2  # 900x420 に棚板1個、1750x460 に側板1個
+    assert inventory.count("合板") == 2  # 確定するまで在庫は変えない
+
+
+def test_claim_and_record_round_trip():
+    inventory = OffcutInventory(":memory:")
+    inventory.add("合板", [(900, 420), (1750, 460)])
+    inventory.add("MDF", [(1750, 460)])
+    best, used = _job(inventory)
+    expected = offcuts_of(best)
+    assert claim_and_record(inventory, "合板", best, "job-1") == len(expected)
+    assert inventory.count("合板") == len(expected)
+    assert sorted((w, d) for _, w, d, _, _ in inventory.list("合板")) == sorted(expected)
+    assert inventory.count("MDF") == 1  # 別の材料の在庫は触らない
+    assert claim_and_record(inventory, "合板", best, "job-1") is None  # 同じ端材は2回使えない
+
+
+def test_claim_is_all_or_nothing():
+    inventory = OffcutInventory(":memory:")
+    inventory.add("合板", [(900, 420), (1750, 460)])
+    ids = [row[0] for row in inventory.list("合板")]
+    assert inventory.claim(ids[:1])
+    assert not inventory.claim(ids)  # 1件でも既に無ければ何も消さない
+    assert inventory.count("合板") == 1
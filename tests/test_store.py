@@ -0,0 +1,89 @@
+# ResultStore：ハンドルのレシピから作り直した配置が、最初に計算した配置と同じになること（user-018）。
+# 置き場を空にして（捨てられた状態にして）から resolve し、SheetLayout.digest を比べる。
+#   python -m pytest tests/test_store.py
+
+import random
+
+from trunktech import TrunkTechEngine, evaluate_candidates
+from trunktech.incremental import repack_result
+from trunktech.layout import SheetLayout
+from trunktech.offcuts import OffcutInventory, attach_offcuts, pack_offcuts
+from trunktech.store import ResultStore, make_recipe, resolve_result
+
+BOARDS = [(1818, 908, "3x6"), (2438, 1218, "4x8")]
+KERF = 3.0
+
+
+def _parts(seed, n=40):
+    rng = random.Random(seed)
+    return [{"n": f"P{i}", "w": rng.randint(200, 1200), "d": rng.randint(80, 600), "qty": rng.randint(1, 5)}
+            for i in range(n)]
+
+
+def _digests(result):
+    return result["layout"].digest(), [o["layout"].digest() for o in result.get("offcuts", ())]
+
+
+def _assert_rebuilds(store, handle, expected):
+    store.clear()
+    assert _digests(store.resolve(handle)) == expected
+    assert store.stats()["rebuilds"] >= 1
+    assert _digests(resolve_result(handle)) == expected  # 置き場を使わずに作り直しても同じ
+
+
+def test_greedy_result_rebuilds_identically():
+    store = ResultStore()
+    parts = _parts(1)
+    best, _ = evaluate_candidates(parts, BOARDS, KERF, workers=1)
+    handle = store.put(best, make_recipe(best, parts, KERF))
+    assert not any(isinstance(v, SheetLayout) for v in handle.values())
+    _assert_rebuilds(store, handle, _digests(best))
+
+
+def test_anytime_result_rebuilds_identically():
+    store = ResultStore()
+    parts = _parts(2)
+    best, _ = evaluate_candidates(parts, BOARDS[:1], KERF, workers=1, budget_ms=30)
+    handle = store.put(best, make_recipe(best, parts, KERF))
+    assert handle["recipe"]["mode"] == "anytime"
+    _assert_rebuilds(store, handle, _digests(best))
+
+
+def test_incremental_result_rebuilds_from_its_base():
+    store = ResultStore()
+    parts = _parts(3)
+    best, _ = evaluate_candidates(parts, BOARDS, KERF, workers=1)
+    base = store.put(best, make_recipe(best, parts, KERF))
+    edited = [dict(p) for p in parts]
+    edited[0]["qty"] += 1
+    edited[5]["qty"] -= 1
+    inc = repack_result(store.resolve(base), edited, KERF)
+    assert inc is not None
+    handle = store.put(inc, make_recipe(inc, edited, KERF, base=base))
+    assert handle["recipe"]["mode"] == "incremental" and handle["recipe"]["depth"] == 1
+    _assert_rebuilds(store, handle, _digests(inc))
+
+
+def test_offcut_layouts_stay_out_of_the_handle_and_rebuild():
+    store = ResultStore()
+    inventory = OffcutInventory(":memory:")
+    inventory.add("合板", [(1200, 600), (900, 450), (1800, 300), (600, 300)])
+    parts = _parts(4, n=15)
+    used, rest = pack_offcuts(TrunkTechEngine(kerf=KERF), parts, inventory, "合板")
+    assert used
+    best, _ = evaluate_candidates(rest, BOARDS, KERF, workers=1)
+    best = attach_offcuts(best, used)
+    handle = store.put(best, make_recipe(best, rest, KERF))
+    assert all("layout" not in o and "key" in o for o in handle["offcuts"])
+    _assert_rebuilds(store, handle, _digests(best))
+
+
+def test_identical_results_are_stored_once():
+    store = ResultStore()
+    parts = _parts(5)
+    a, _ = evaluate_candidates(parts, BOARDS, KERF, workers=1)
+    b, _ = evaluate_candidates(list(reversed(parts)), BOARDS, KERF, workers=1)
+    ha = store.put(a, make_recipe(a, parts, KERF))
+    hb = store.put(b, make_recipe(b, parts, KERF))
+    assert ha["key"] == hb["key"]
+    assert store.stats()["entries"] == 1 and store.stats()["shared"] == 1
@@ -0,0 +1,22 @@
+# TrunkTechEngine（木取りエンジン）パッケージ
+# Streamlit に依存しない部分（配置計算・結果の表現・候補評価・キャッシュ・描画・印刷・書き出し・端材の在庫）をまとめる。
+# 受注システムなどからは import して使い、まとめて処理するときは python -m trunktech batch を使う。
+
+from .boards import BOARD_PRESETS, as_long_short, parse_boards
+from .cache import PackCache, RenderCache, canonical_parts
+from .engine import ORDERS, TrunkTechEngine
+from .evaluate import evaluate_candidates, rank_key
+from .export import iter_cut_csv, iter_dxf, write_export
+from .layout import SheetLayout
+from .offcuts import OffcutInventory, pack_offcuts
+from .optimize import pack_anytime, sheet_lower_bound
+from .printing import build_print_html, iter_print_html, write_print_html
+from .render import diagram_items, render_sheet, render_thumbnails
+from .svg import render_sheet_svg
+
+__all__ = [
+    "BOARD_PRESETS", "ORDERS", "OffcutInventory", "PackCache", "RenderCache", "SheetLayout", "TrunkTechEngine",
+    "as_long_short", "build_print_html", "canonical_parts", "diagram_items", "evaluate_candidates", "iter_cut_csv",
+    "iter_dxf", "iter_print_html", "pack_anytime", "pack_offcuts", "parse_boards", "rank_key", "render_sheet",
+    "render_sheet_svg", "render_thumbnails", "sheet_lower_bound", "write_export", "write_print_html",
+]
@@ -0,0 +1,36 @@
+# 定尺板の寸法
+# 板寸法は鼻切り分のみ控え（-2mm）。エンジンには常に (長手, 短手, 表示名) で渡す
+
+BOARD_TRIM = 2
+
+# 表示名 → (縦, 横) mm。アプリの初期値と同じ
+BOARD_PRESETS = {
+    "3x6": (1820, 910),
+    "4x8": (2440, 1220),
+    "集成材": (3600, 500),
+}
+
+
+def as_long_short(a, b, label):
+    """板の寸法 a x b を (長手 - 鼻切り, 短手 - 鼻切り, 表示名) にする"""
+    lo, sh = max(a, b), min(a, b)
+    return (lo - BOARD_TRIM, sh - BOARD_TRIM, label)
+
+
+def parse_boards(spec):
+    """"3x6" / "4x8" / "集成材" / "auto"（全部）/ "1820x910" のような指定を
+    エンジンに渡す板のリスト [(vw, vh, 表示名), ...] にする。カンマ区切りで複数指定できる。"""
+    boards = []
+    for item in str(spec).split(","):
+        item = item.strip()
+        if item == "auto":
+            boards.extend(as_long_short(a, b, lab) for lab, (a, b) in BOARD_PRESETS.items())
+        elif item in BOARD_PRESETS:
+            boards.append(as_long_short(*BOARD_PRESETS[item], item))
+        else:
+            try:
+                a, b = (float(v) for v in item.lower().split("x"))
+            except ValueError:
+                raise ValueError(f"板の指定が読めません: {item!r}（3x6 / 4x8 / 集成材 / auto / 1820x910）")
+            boards.append(as_long_short(a, b, item))
+    return boards
@@ -0,0 +1,179 @@
+# 木取り結果のキャッシュ
+# キーは「寸法と枚数の組（名前なし）」＋板寸法・刃物厚・計算モード。名前は取り出した後で付け替える。
+# プロセス内の LRU（上限件数・上限バイト数）に加え、path を指定すると SQLite ファイルにも保存して再起動後も使える。
+# 木取図の画像（PNG / SVG のバイト列）は RenderCache に合計サイズの上限付きで置く。
+
+import hashlib
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from .engine import _normalize_part
+
+
+def canonical_parts(parts):
+    """部品リストを名前なしの正規形に変換する。
+    戻り値: (groups, names_by_dims)
+      groups: 同じ寸法をまとめ、寸法の大きい順に並べた ((w, d, qty), ...)。キャッシュのキーに使う。
+      names_by_dims: {(w, d): [(名称, 個数), ...]}（入力順）。SheetLayout.relabel で名前を戻すのに使う。"""
+    qty_by_dims = {}
+    names_by_dims = {}
+    for p in parts:
+        qty = int(p.get("qty", 1))
+        if qty <= 0:
+            continue
+        q = _normalize_part(p)
+        dims = (q["w"], q["d"])
+        qty_by_dims[dims] = qty_by_dims.get(dims, 0) + qty
+        names_by_dims.setdefault(dims, []).append((q["n"], qty))
+    groups = tuple(sorted(((w, d, qty) for (w, d), qty in qty_by_dims.items()), reverse=True))
+    return groups, names_by_dims
+
+
+def anonymous_parts(groups):
+    """canonical_parts の groups をエンジンに渡せる部品リストにする（名前は空）。"""
+    return [{"n": "", "w": w, "d": d, "qty": qty} for w, d, qty in groups]
+
+
+def _result_nbytes(value):
+    """キャッシュに置く木取り結果のおおよそのメモリ量（SheetLayout.nbytes。レイアウトを持たない値は 0）"""
+    layout = value.get("layout") if isinstance(value, dict) else None
+    return layout.nbytes() if layout is not None else 0
+
+
+class PackCache:
+    """木取り結果の LRU キャッシュ（スレッドセーフ）。Streamlit の外でも使える。
+    max_entries: メモリに置く件数の上限。max_bytes: メモリに置く結果（SheetLayout.nbytes）の合計の上限（None なら件数だけ）。
+    path: SQLite ファイル（None ならメモリのみ）。max_disk_entries: ファイルに置く件数の上限（古く使われていないものから消す）。"""
+
+    def __init__(self, max_entries=128, path=None, max_disk_entries=10000, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_disk_entries = max_disk_entries
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()  # key → (値, バイト数)
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS pack_cache (key TEXT PRIMARY KEY, value BLOB, atime REAL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS pack_cache_atime ON pack_cache (atime)")
+            self._db.commit()
+
+    @staticmethod
+    def make_key(groups, vw, vh, kerf, mode):
+        return (groups, float(vw), float(vh), float(kerf), mode)
+
+    @staticmethod
+    def _disk_key(key):
+        return hashlib.sha256(repr(key).encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """キャッシュにあれば値を、無ければ None を返す。"""
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key][0]
+            if self._db is not None:
+                dk = self._disk_key(key)
+                row = self._db.execute("SELECT value FROM pack_cache WHERE key = ?", (dk,)).fetchone()
+                if row is not None:
+                    self._db.execute("UPDATE pack_cache SET atime = ? WHERE key = ?", (time.time(), dk))
+                    self._db.commit()
+                    value = pickle.loads(row[0])
+                    self._remember(key, value)
+                    self.hits += 1
+                    return value
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._remember(key, value)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO pack_cache (key, value, atime) VALUES (?, ?, ?)",
+                    (self._disk_key(key), pickle.dumps(value, pickle.HIGHEST_PROTOCOL), time.time()),
+                )
+                self._db.execute(
+                    "DELETE FROM pack_cache WHERE key NOT IN "
+                    "(SELECT key FROM pack_cache ORDER BY atime DESC LIMIT ?)",
+                    (self.max_disk_entries,),
+                )
+                self._db.commit()
+
+    def _remember(self, key, value):
+        size = _result_nbytes(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return  # 1件で上限を超えるものはメモリには置かない（ファイルには置く）
+        old = self._items.pop(key, None)
+        if old is not None:
+            self.nbytes -= old[1]
+        self._items[key] = (value, size)
+        self.nbytes += size
+        while len(self._items) > self.max_entries or (self.max_bytes is not None and self.nbytes > self.max_bytes):
+            _, (_, dropped) = self._items.popitem(last=False)
+            self.nbytes -= dropped
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.nbytes = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM pack_cache")
+                self._db.commit()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._items), "bytes": self.nbytes}
+
+
+class RenderCache:
+    """描画済みの木取図（バイト列）の LRU キャッシュ（スレッドセーフ）。
+    キーは呼び出し側で決める（SheetLayout.sheet_digest・板寸法・表示名・描画サイズなど）。
+    合計が max_bytes を超えたら古く使われていないものから捨てる。"""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """key の画像があれば返し、無ければ None を返す。"""
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return data
+            self.misses += 1
+            return None
+
+    def put(self, key, data):
+        with self._lock:
+            if key not in self._items and len(data) <= self.max_bytes:
+                self._items[key] = data
+                self.nbytes += len(data)
+                while self.nbytes > self.max_bytes:
+                    _, old = self._items.popitem(last=False)
+                    self.nbytes -= len(old)
+
+    def get_or_render(self, key, render):
+        """key の画像を返す。無ければ render() を呼んで作り、覚えておく。"""
+        data = self.get(key)
+        if data is None:
+            data = render()
+            self.put(key, data)
+        return data
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._items), "bytes": self.nbytes}
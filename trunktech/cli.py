@@ -0,0 +1,227 @@
+# コマンドライン（Streamlit なしで使う）
+#   python -m trunktech batch orders.jsonl cutlist1.csv ... --board auto --workers 8 --out results.jsonl
+# 切板リスト（CSV: 1ファイル1注文 / JSONL: 1行1注文）を読み、プロセスプールで木取りして
+# 結果を JSONL で1注文ずつ書き出す。--diagrams を付けると注文ごとに印刷用HTML（SVG）も書く。
+# --cuts / --dxf を付けると注文ごとにパネルソー用の切断手順 CSV・DXF も書く（trunktech.export）。
+# --offcuts を付けると、その端材の在庫（SQLite）から先に部品を置き、新しく出た端材を在庫に登録する（trunktech.offcuts）。
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from .boards import parse_boards
+from .engine import TrunkTechEngine
+from .evaluate import evaluate_candidates
+from .export import iter_cut_csv, iter_dxf, write_export
+from .ingest import ingest_chunks, ingest_frame, read_cut_list, result_parts
+from .offcuts import OffcutInventory, attach_offcuts, offcuts_of, pack_offcuts
+from .printing import write_print_html
+
+
+def read_csv_order(path, encoding="utf-8-sig"):
+    """CSV / Excel 1ファイルを1注文にする。ファイルは run_order の中で読む（読めないファイル・不正な行はその注文だけの問題にする）。"""
+    return {"id": os.path.splitext(os.path.basename(path))[0], "file": path, "encoding": encoding}
+
+
+def order_parts(order, boards=()):
+    """注文の部品をアプリと同じ規則（trunktech.ingest）で検査し、(部品リスト, 取り込み結果) を返す。
+    "file" は CSV / Excel を読み、"parts"（JSONL）は同じ列名の表として検査する（"qty" を省いた部品は 1枚）。"""
+    if "file" in order:
+        result = ingest_chunks(read_cut_list(order["file"], order["file"], order.get("encoding", "utf-8-sig")), boards)
+    else:
+        import pandas as pd
+
+        result = ingest_frame(pd.DataFrame([{"qty": 1, **p} for p in order["parts"]]), boards)
+    return result_parts(result), result
+
+
+def iter_orders(paths, encoding="utf-8-sig"):
+    """入力ファイルから注文を1件ずつ読み出す（全件をメモリに載せない）。"-" は標準入力の JSONL。"""
+    for path in paths:
+        if path == "-" or path.endswith((".jsonl", ".ndjson")):
+            f = sys.stdin if path == "-" else open(path, encoding="utf-8")
+            try:
+                for lineno, line in enumerate(f, 1):
+                    line = line.strip()
+                    if line:
+                        order = json.loads(line)
+                        order.setdefault("id", f"{os.path.basename(path)}:{lineno}")
+                        yield order
+            finally:
+                if f is not sys.stdin:
+                    f.close()
+        else:
+            yield read_csv_order(path, encoding)
+
+
+def _safe_name(s):
+    return re.sub(r"[^\w.-]+", "_", str(s)) or "order"
+
+
+def run_order(order, board="auto", kerf=3.0, budget_ms=0, diagrams=None, with_layout=True, cuts=None, dxf=None,
+              cuts_encoding="utf-8-sig", offcuts=None, material=None):
+    """1注文を木取りして JSON にできる dict を返す（プロセスプールの中で呼ばれる）。
+    部品はアプリと同じ規則で検査し、読み飛ばした行を "skipped_rows"（件数）・"rejected"（行・名称・理由）に入れる。
+    diagrams・cuts・dxf はそれぞれ印刷用HTML・切断手順 CSV・DXF を書き出すフォルダ。
+    offcuts は端材の在庫ファイル。material（注文の "material" が優先）の端材を先に使い、
+    使った端材は在庫から取り出し、新しく出た端材を登録する。どちらも無ければ板が1種類のときだけその板の名前を使い、
+    複数の板を試すとき（auto など）はエラーにする（違う板の端材が同じ在庫に混ざるため）。"""
+    started = time.perf_counter()
+    used = []
+    inventory = None
+    try:
+        spec = order.get("board", board)
+        boards = parse_boards(spec)
+        kerf = float(order.get("kerf", kerf))
+        material = order.get("material") or material
+        parts, ingested = order_parts(order, boards)
+        if offcuts:
+            if not material:
+                if len(boards) != 1:
+                    raise ValueError(f"端材を使うときは material（--material）を指定してください（板の指定: {spec}）")
+                material = boards[0][2]
+            inventory = OffcutInventory(offcuts)
+            used, parts = pack_offcuts(TrunkTechEngine(kerf=kerf), parts, inventory, material, claim=True)
+        best, _ = evaluate_candidates(parts, boards, kerf, workers=1, budget_ms=budget_ms)
+    except Exception as e:  # 1件の不備でバッチ全体を止めない
+        if used:
+            inventory.add(material, [(o["w"], o["d"]) for o in used], "returned")  # 取り出した端材は在庫に戻す
+        return {"id": order.get("id"), "error": f"{type(e).__name__}: {e}"}
+    if inventory is not None:
+        best = attach_offcuts(best, used)
+        added = inventory.add(material, offcuts_of(best), str(order.get("id")))
+    layout = best["layout"]
+    requested = sum(ingested["counts"].values())
+    board_area = layout.sheet_count * layout.vw * layout.vh
+    patterns = layout.patterns()
+    result = {
+        "id": order.get("id"),
+        "board": best["label"], "vw": best["vw"], "vh": best["vh"], "kerf": kerf,
+        "sheet_count": layout.sheet_count,
+        "pattern_count": len(patterns),
+        "parts_requested": requested, "parts_placed": best["total_parts_placed"],
+        "utilization": round(layout.used_area() / board_area, 4) if board_area else 0.0,
+        "order": best["order"],
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+    if ingested["rejected_count"]:
+        result["skipped_rows"] = ingested["rejected_count"]
+        result["rejected"] = ingested["rejected"]
+    if ingested["oversize_count"]:
+        result["oversize_rows"] = ingested["oversize_count"]
+    if inventory is not None:
+        result["material"] = material
+        result["offcuts_used"] = [
+            {"id": o["id"], "w": o["w"], "d": o["d"], "parts_placed": o["layout"].part_count} for o in used
+        ]
+        result["offcuts_added"] = added
+    if with_layout:
+        result["sheets"] = [[list(p) for p in layout.parts(s)] for s in range(layout.sheet_count)]
+        result["patterns"] = [[s + 1 for s in g] for g in patterns]  # 同じ並びの板 ID のまとまり
+        if used:
+            result["offcut_sheets"] = [[list(p) for p in o["layout"].parts(0)] for o in used]
+    if diagrams:
+        path = os.path.join(diagrams, _safe_name(order.get("id")) + ".html")
+        with open(path, "wb") as f:
+            write_print_html(best, f=f)
+        result["diagram"] = path
+    base = _safe_name(order.get("id"))
+    if cuts:
+        path = os.path.join(cuts, base + ".csv")
+        with open(path, "wb") as f:
+            write_export(iter_cut_csv(best), f, cuts_encoding)
+        result["cuts"] = path
+    if dxf:
+        path = os.path.join(dxf, base + ".dxf")
+        with open(path, "wb") as f:
+            write_export(iter_dxf(best), f, "cp932")
+        result["dxf"] = path
+    return result
+
+
+def _run_order_args(args):
+    return run_order(*args)
+
+
+def imap_bounded(executor, fn, items, max_pending):
+    """executor.map と同じく入力順に結果を返すが、先読みは max_pending 件まで（入力を全部は読まない）。"""
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def cmd_batch(args):
+    for folder in (args.diagrams, args.cuts, args.dxf):
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+    jobs = (
+        (order, args.board, args.kerf, args.budget_ms, args.diagrams, not args.no_layout, args.cuts, args.dxf,
+         args.cuts_encoding, args.offcuts, args.material)
+        for order in iter_orders(args.inputs, args.encoding)
+    )
+    out = open(args.out, "w", encoding="utf-8") if args.out else sys.stdout
+    started = time.perf_counter()
+    n_orders = n_sheets = n_errors = 0
+    try:
+        if args.workers > 1:
+            with ProcessPoolExecutor(max_workers=args.workers) as ex:
+                results = imap_bounded(ex, _run_order_args, jobs, args.workers * 4)
+                for r in results:
+                    n_orders += 1
+                    n_sheets += r.get("sheet_count", 0)
+                    n_errors += "error" in r
+                    out.write(json.dumps(r, ensure_ascii=False) + "\n")
+                    out.flush()
+        else:
+            for job in jobs:
+                r = _run_order_args(job)
+                n_orders += 1
+                n_sheets += r.get("sheet_count", 0)
+                n_errors += "error" in r
+                out.write(json.dumps(r, ensure_ascii=False) + "\n")
+                out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(
+        f"{n_orders} orders, {n_sheets} sheets, {n_errors} errors in {time.perf_counter() - started:.1f}s",
+        file=sys.stderr,
+    )
+    return 1 if n_errors else 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m trunktech", description="TrunkTechEngine 木取りのコマンドライン")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("batch", help="切板リスト（CSV / JSONL）をまとめて木取りし、結果を JSONL で書き出す")
+    p.add_argument("inputs", nargs="+", help="CSV・Excel（1ファイル1注文）・JSONL（1行1注文）。- は標準入力の JSONL")
+    p.add_argument("--board", default="auto", help="3x6 / 4x8 / 集成材 / auto / 1820x910（カンマ区切りで複数）")
+    p.add_argument("--kerf", type=float, default=3.0, help="刃物厚 mm（既定 3.0）")
+    p.add_argument("--budget-ms", type=float, default=0, help="注文ごとの最適化時間 ms（0 なら通常計算）")
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="並列数（既定は CPU 数）")
+    p.add_argument("--out", help="結果の JSONL（省略時は標準出力）")
+    p.add_argument("--diagrams", help="注文ごとの印刷用HTML（SVG の木取図）を書き出すフォルダ")
+    p.add_argument("--cuts", help="注文ごとの切断手順 CSV（縦挽き・横切り・仕上げ、パターンごと）を書き出すフォルダ")
+    p.add_argument("--cuts-encoding", default="utf-8-sig", help="切断手順 CSV の文字コード（既定 utf-8-sig。cp932 など）")
+    p.add_argument("--dxf", help="注文ごとの DXF（R12・Shift_JIS、パターンごと）を書き出すフォルダ")
+    p.add_argument("--offcuts", help="端材の在庫（SQLite ファイル）。先に端材へ部品を置き、新しく出た端材を登録する")
+    p.add_argument("--material", help="端材の材料名（注文の material が優先。省略できるのは板が1種類のときだけで、その板の名前になる）")
+    p.add_argument("--no-layout", action="store_true", help="結果に部品の座標（sheets）を含めない")
+    p.add_argument("--encoding", default="utf-8-sig", help="CSV の文字コード（CAD の出力なら cp932 など）")
+    p.set_defaults(func=cmd_batch)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
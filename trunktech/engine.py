@@ -0,0 +1,253 @@
+# 木取りエンジン (TrunkTechEngine)
+# Streamlit に依存しない。UI（itadori.py）やバッチ処理から import して使う。
+
+import bisect
+
+from .layout import SheetLayout
+
+
+def _normalize_part(p):
+    """長方形部品は定尺板の長手方向に長辺を沿わせるため、w=長辺・d=短辺に正規化する。"""
+    w, d = p["w"], p["d"]
+    return {**p, "w": max(w, d), "d": min(w, d)}
+
+
+def _staircase(points):
+    """点 (高さ, 残り幅) のうち、高さも残り幅も上回る点が他に無いものだけを残す。
+    戻り値: (高さの昇順のタプル, 残り幅のタプル（降順）)。高さ d 以上の点の最大の残り幅は bisect 1回で引ける。"""
+    hs, rems = [], []
+    best = float("-inf")
+    for h, rem in sorted(points, reverse=True):
+        if rem > best:
+            best = rem
+            hs.append(h)
+            rems.append(rem)
+    return tuple(reversed(hs)), tuple(reversed(rems))
+
+
+class _OpenRowIndex:
+    """空きのある段（row）の索引。
+    板番号のセグメント木で、各節に「その範囲の板の段（高さ, 残り幅）と、新しい段の余地（残り高さ, 板の長手）」の
+    階段（_staircase）を持つ。部品 (w, d) が入る＝高さ d 以上の点の最大の残り幅が w 以上、なので、
+    入る最初の板を根から O(log 板枚数 × log 階段の長さ) でたどれる。段高さの種類が多くても走査しない。
+    板が増えたら容量を倍にして作り直す（償却 O(1)）。"""
+
+    def __init__(self, vw, vh, capacity=16):
+        self.vw = vw
+        self.vh = vh
+        self.size = 1
+        while self.size < capacity:
+            self.size *= 2
+        self.hs = [()] * (2 * self.size)  # 節ごとの階段の高さ
+        self.rems = [()] * (2 * self.size)  # 節ごとの階段の残り幅
+
+    def _merge(self, i):
+        """節 i の階段を子から作る"""
+        hs, rems = self.hs, self.rems
+        a, b = 2 * i, 2 * i + 1
+        if not hs[b]:
+            return hs[a], rems[a]
+        if not hs[a]:
+            return hs[b], rems[b]
+        return _staircase(list(zip(hs[a], rems[a])) + list(zip(hs[b], rems[b])))
+
+    def _grow(self, index):
+        size = self.size
+        while size <= index:
+            size *= 2
+        old = self.size
+        self.size = size
+        self.hs = [()] * size + self.hs[old:] + [()] * (size - old)
+        self.rems = [()] * size + self.rems[old:] + [()] * (size - old)
+        for i in range(size - 1, 0, -1):
+            self.hs[i], self.rems[i] = self._merge(i)
+
+    def update_sheet(self, sheet_index, sheet, like=None):
+        """板 sheet の段・残り高さを索引に反映する（板に部品を置いた後に呼ぶ）。
+        like に板番号を渡すと、その板と同じ並びとして階段を作り直さずに使う（複製した板）。"""
+        if sheet_index >= self.size:
+            self._grow(sheet_index)
+        hs, rems = self.hs, self.rems
+        i = self.size + sheet_index
+        if like is None:
+            vw = self.vw
+            points = [(r["h"], vw - r["used_w"]) for r in sheet["rows"]]
+            points.append((self.vh - sheet["used_h"], vw))  # 新しい段は長手いっぱいに使える
+            hs[i], rems[i] = _staircase(points)
+        else:
+            j = self.size + like
+            hs[i], rems[i] = hs[j], rems[j]
+        i //= 2
+        while i:
+            h, r = self._merge(i)
+            if h == hs[i] and r == rems[i]:
+                break  # ここから上は変わらない
+            hs[i], rems[i] = h, r
+            i //= 2
+
+    def first_sheet(self, w, d):
+        """部品 (w, d) を既存の段か新しい段に置ける最初の板番号。無ければ None。"""
+        hs, rems, bisect_left = self.hs, self.rems, bisect.bisect_left
+
+        def fits(i):
+            k = bisect_left(hs[i], d)
+            return k < len(hs[i]) and rems[i][k] >= w
+
+        if not fits(1):
+            return None
+        i = 1
+        size = self.size
+        while i < size:
+            i = 2 * i if fits(2 * i) else 2 * i + 1
+        return i - size
+
+
+# 部品の並べ順（大きい順に置く。キーは降順で使う）
+# "wd": 長辺→短辺（従来どおり）/ "dw": 短辺→長辺 / "area": 面積 / "kerf_area": 刃物厚込みの面積
+ORDERS = ("wd", "dw", "area", "kerf_area")
+
+# progress を呼ぶ間隔（空き段の索引を引く回数・複製する板の枚数）
+PROGRESS_EVERY = 256
+
+
+def _sort_key(order, kerf):
+    if order == "wd":
+        return lambda x: (x["w"], x["d"])
+    if order == "dw":
+        return lambda x: (x["d"], x["w"])
+    if order == "area":
+        return lambda x: (x["w"] * x["d"], x["w"])
+    if order == "kerf_area":
+        return lambda x: ((x["w"] + kerf) * (x["d"] + kerf), x["w"])
+    raise ValueError(f"unknown order: {order}")
+
+
+class TrunkTechEngine:
+    def __init__(self, kerf: float = 3.0, progress=None):
+        """progress: 配置の途中で progress(置いた部品数, 板枚数) を呼ぶ関数（例外を投げれば計算を中断できる）"""
+        self.kerf = kerf
+        self.progress = progress
+        # 計測用の件数（pack_in_order のたびに足していく）。
+        # index_lookups: 空き段の索引を引いた回数 / rows_scanned: 板の中で調べた段の数 / sheets_cloned: 複製した板
+        self.counters = {"index_lookups": 0, "rows_scanned": 0, "sheets_cloned": 0}
+
+    def pack_layout(self, parts, vw, vh, order="wd"):
+        """
+        定尺板 vw(長手) x vh(短手) に部品を配置する。
+        長方形部品は必ず長辺を長手方向(vw)に、短辺を短手方向(vh)に配置する。
+        定尺を超える部品は配置しない。
+        配置は「先頭の板・先頭の段から最初に入る場所」(first-fit) で、
+        空き段の索引 (_OpenRowIndex) により板枚数に対して対数時間で探す。
+
+        parts の各要素は {"n", "w", "d"} に加えて枚数 "qty"（省略時 1）を持てる。
+        同寸法の部品はまとめて置き、1枚ずつ展開して並べた場合と同じ配置を返す。
+        order は部品を置く順番（ORDERS のいずれか。既定は長辺→短辺の大きい順）。
+        戻り値は SheetLayout（配列ベースの省メモリ表現）。
+        """
+        valid = self.prepare_parts(parts, vw, vh)
+        # 安定ソートなので、同寸法の部品は入力順のまま連続して並ぶ
+        sorted_groups = sorted(valid, key=_sort_key(order, self.kerf), reverse=True)
+        return self.pack_in_order(sorted_groups, vw, vh)
+
+    def prepare_parts(self, parts, vw, vh):
+        """部品を (w=長辺, d=短辺, qty) に正規化し、枚数 0 以下と定尺を超える部品を除いて返す。"""
+        groups = []
+        for p in parts:
+            qty = int(p.get("qty", 1))
+            if qty > 0:
+                g = _normalize_part(dict(p))
+                g["qty"] = qty
+                groups.append(g)
+        valid = [g for g in groups if g["w"] <= vw and g["d"] <= vh]
+        if len(valid) < len(groups):
+            # 定尺を超える部品は除外（UIで警告するため件数を返せるようにする場合は呼び出し元で対応）
+            pass
+        return valid
+
+    def pack_in_order(self, groups, vw, vh, sheets=None, names=(), max_sheets=None):
+        """prepare_parts 済みの groups を並べ替えず、この順番で first-fit 配置する。
+        sheets（作業用表現、SheetLayout.to_work_sheets）と names（その名前の並び）を渡すと、
+        既存の板を残したまま、その空きから順に追加の部品を置く（差分の再計算用）。
+        max_sheets を渡すと板をそれ以上増やさず、入りきらない部品は置かない（端材1枚に詰めるときなど）。"""
+        sheets = list(sheets) if sheets else []
+        index = _OpenRowIndex(vw, vh)
+        for i, s in enumerate(sheets):
+            index.update_sheet(i, s)
+        names = {n: i for i, n in enumerate(names)}  # 部品名 → 名前番号（同じ名前は1つにまとめる）
+        kerf = self.kerf
+        scanned = [0]
+
+        def place_run(s, p, count):
+            """板 s に部品 p を最大 count 個置き、置けた個数を返す。
+            段が埋まるまでは同じ段に続けて並べる（前の段・前の板には入らないことが分かっているため）。"""
+            w, d = p["w"], p["d"]
+            n = names.setdefault(p["n"], len(names))
+            placed = 0
+            while placed < count:
+                for k, r in enumerate(s["rows"]):
+                    if r["h"] >= d and (vw - r["used_w"]) >= w:
+                        scanned[0] += k + 1
+                        break
+                else:
+                    scanned[0] += len(s["rows"])
+                    if (vh - s["used_h"]) < d:
+                        break
+                    r = {"y": s["used_h"], "h": d, "used_w": 0, "parts": []}
+                    s["rows"].append(r)
+                    s["used_h"] += d + kerf
+                row_parts = r["parts"]
+                while placed < count and (vw - r["used_w"]) >= w:
+                    row_parts.append((n, r["used_w"], w, d))
+                    r["used_w"] += w + kerf
+                    placed += 1
+            return placed
+
+        lookups = cloned = done = 0
+        report = self.progress
+        for p in groups:
+            remaining = p["qty"]
+            while remaining:
+                lookups += 1
+                if report is not None and not lookups % PROGRESS_EVERY:
+                    report(done, len(sheets))
+                i = index.first_sheet(p["w"], p["d"])
+                fresh = i is None
+                if fresh:
+                    if max_sheets is not None and len(sheets) >= max_sheets:
+                        break  # 板を増やせないので、この部品の残りは置かない
+                    i = len(sheets)
+                    sheets.append({"used_h": 0, "rows": []})
+                s = sheets[i]
+                placed = place_run(s, p, remaining)
+                remaining -= placed
+                done += placed
+                index.update_sheet(i, s)
+                if fresh and remaining >= placed:
+                    # 新しい板を同じ部品だけで埋め切った：残りも同じ並びの板になるので複製する
+                    copies = remaining // placed
+                    if max_sheets is not None:
+                        copies = min(copies, max_sheets - len(sheets))
+                    for k in range(copies):
+                        if report is not None and k and not k % PROGRESS_EVERY:
+                            report(done + k * placed, len(sheets))  # 複製が多くても途中で中断できる
+                        sheets.append({
+                            "used_h": s["used_h"],
+                            "rows": [
+                                {**r, "parts": list(r["parts"])} for r in s["rows"]
+                            ],
+                        })
+                        index.update_sheet(len(sheets) - 1, sheets[-1], like=i)
+                    cloned += copies
+                    done += copies * placed
+                    remaining -= copies * placed
+        counters = self.counters
+        counters["index_lookups"] += lookups
+        counters["rows_scanned"] += scanned[0]
+        counters["sheets_cloned"] += cloned
+        if report is not None:
+            report(done, len(sheets))
+        return SheetLayout(vw, vh, names, sheets)
+
+    def pack_sheets(self, parts, vw, vh, order="wd"):
+        """pack_layout と同じ配置を従来の dict のリスト（板 → 段 → 部品）で返す。"""
+        return self.pack_layout(parts, vw, vh, order).to_dicts()
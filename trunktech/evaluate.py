@@ -0,0 +1,189 @@
+# 板サイズ × 並べ順の候補をまとめて評価し、最も効率の良い木取りを選ぶ
+# 候補が多い・部品が多いときはプロセスプールで並列に計算する。
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from .cache import PackCache, anonymous_parts, canonical_parts
+from .engine import ORDERS, TrunkTechEngine
+from .optimize import pack_anytime
+from .perf import timed
+
+# 並列数の既定値（環境変数 ITADORI_WORKERS で変更可。1 以下なら並列化しない）
+DEFAULT_WORKERS = int(os.environ.get("ITADORI_WORKERS", 0)) or (os.cpu_count() or 1)
+
+# 並列計算中に progress を呼ぶ間隔（秒）。候補が終わらなくても、この間隔で中断できる
+PROGRESS_INTERVAL = 0.25
+
+# 候補1つの計算量の目安は「部品の種類数 + 部品数 / PIECE_COST_DIV」（種類ごとの探索と、板・段を開ける手間）。
+# 候補数を掛けた計算量がこれ以下ならその場で計算する（約 0.1 秒。プロセス間の受け渡しの方が高くつく）。
+# どちらで計算しても評価する候補は同じ（速さだけが変わる）
+INLINE_MAX_COST = 3000
+PIECE_COST_DIV = 8
+
+_executor = None
+_executor_workers = 0
+_executor_lock = threading.Lock()
+
+
+def get_executor(workers=None):
+    """プロセスプールを1つだけ作って使い回す（起動コストを毎回払わないため）。
+    Streamlit のサーバープロセスを fork しないよう spawn で起動する。
+    複数のスレッドから呼んでよい。ワーカーが落ちて使えなくなったプールは作り直す。"""
+    global _executor, _executor_workers
+    workers = workers or DEFAULT_WORKERS
+    with _executor_lock:
+        broken = _executor is not None and getattr(_executor, "_broken", False)
+        if _executor is None or _executor_workers != workers or broken:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _executor_workers = workers
+        return _executor
+
+
+def _discard_executor(executor):
+    """壊れたプールを捨てる（次の get_executor で作り直す）。他のスレッドが既に作り直していれば何もしない。"""
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False)
+
+
+def _pack_candidate(args, progress=None):
+    parts, vw, vh, label, order, kerf = args
+    engine = TrunkTechEngine(kerf=kerf, progress=progress)
+    layout = engine.pack_layout(parts, vw, vh, order)
+    return {
+        "label": label, "layout": layout, "sheet_count": layout.sheet_count,
+        "vw": vw, "vh": vh, "score": layout.sheet_count * (vw * vh),
+        "total_parts_placed": layout.part_count, "order": order,
+        "counters": engine.counters,
+    }
+
+
+def _optimize_candidate(args, progress=None):
+    parts, vw, vh, label, budget_ms, kerf = args
+    engine = TrunkTechEngine(kerf=kerf, progress=progress)
+    layout, info = pack_anytime(engine, parts, vw, vh, budget_ms)
+    return {
+        "label": label, "layout": layout, "sheet_count": layout.sheet_count,
+        "vw": vw, "vh": vh, "score": layout.sheet_count * (vw * vh),
+        "total_parts_placed": layout.part_count, "order": info["order"],
+        "optimize": info, "counters": engine.counters,
+    }
+
+
+def rank_key(n_requested):
+    """全部品を配置できる結果を優先し、その中で枚数優先・同枚数なら面積が小さい板を選ぶ順位キー"""
+    return lambda x: (
+        0 if x["total_parts_placed"] == n_requested else 1,  # 全配置を最優先
+        -x["total_parts_placed"],  # 多く配置できているほど良い
+        x["sheet_count"],
+        x["score"],
+    )
+
+
+def _with_names(result, names_by_dims):
+    return {**result, "layout": result["layout"].relabel(names_by_dims)}
+
+
+def evaluate_candidates(parts, boards, kerf, orders=ORDERS, workers=None, budget_ms=0, cache=None, perf=None,
+                        progress=None):
+    """boards: [(vw, vh, label), ...] と orders の全組み合わせで木取りを計算し、
+    (最良の結果, 全候補の結果リスト) を返す。
+    結果は候補の並び（板の順 → 並べ順の順）で並び、同点なら先の候補を選ぶので、
+    並列数に関係なく同じ結果になる（並列にするかどうかは速さだけで決め、評価する候補は変えない）。
+    budget_ms > 0 のときは板サイズごとに pack_anytime で時間いっぱい改善する
+    （並べ順の候補は pack_anytime の中で試す）。結果の "optimize" に下限・時間などが入る。
+    cache（PackCache）を渡すと、同じ寸法・枚数・板・刃物厚・モードの計算結果を使い回す。
+    計算は名前なしの正規形（canonical_parts）で行い、最後に部品名を付け直す。
+    perf（PerfRecorder）を渡すと、板サイズごとの計算時間・キャッシュの当たり・エンジンの件数を記録する。
+    progress を渡すと途中経過を progress({"candidates_done", "candidates", "parts_placed", "parts_total", "sheets"})
+    で知らせる（並列時は候補が1つ終わるごと、その場で計算するときは配置の途中でも）。
+    progress が例外を投げると、残りの候補を取り消してその例外を上げる（中断用）。"""
+    with timed(perf, "canonicalize"):
+        groups, names_by_dims = canonical_parts(parts)
+    anon = anonymous_parts(groups)
+    n_requested = sum(qty for _, _, qty in groups)
+    workers = workers or DEFAULT_WORKERS
+    if budget_ms > 0:
+        # 全体の待ち時間が budget_ms に収まるよう、並列で回せない分は候補ごとの時間を割る
+        n_boards = len(boards)
+        parallel = workers > 1 and n_boards > 1
+        rounds = -(-n_boards // min(workers, n_boards)) if parallel else max(n_boards, 1)
+        func = _optimize_candidate
+        candidates = [(anon, vw, vh, label, budget_ms / rounds, kerf) for vw, vh, label in boards]
+        modes = [("anytime", budget_ms / rounds)] * len(candidates)
+    else:
+        cost = len(boards) * len(orders) * (len(groups) + n_requested // PIECE_COST_DIV)
+        parallel = workers > 1 and cost > INLINE_MAX_COST
+        func = _pack_candidate
+        candidates = [(anon, vw, vh, label, order, kerf) for vw, vh, label in boards for order in orders]
+        modes = [("greedy", c[4]) for c in candidates]
+
+    keys = [PackCache.make_key(groups, c[1], c[2], kerf, m) + (c[3],) for c, m in zip(candidates, modes)]
+    with timed(perf, "cache_lookup"):
+        results = [cache.get(k) if cache is not None else None for k in keys]
+    missing = [i for i, r in enumerate(results) if r is None]
+
+    def report(done, placed=0, sheets=0):
+        if progress is not None:
+            progress({
+                "candidates_done": len(candidates) - len(missing) + done, "candidates": len(candidates),
+                "parts_placed": placed, "parts_total": n_requested, "sheets": sheets,
+            })
+
+    report(0)
+    if parallel and len(missing) > 1:
+        with timed(perf, "pack:parallel"):
+            executor = get_executor(workers)
+            futures, by_index = {}, {}
+            last = (0, 0)
+            try:
+                for i in missing:
+                    futures[executor.submit(func, candidates[i])] = i
+                pending = set(futures)
+                while pending:
+                    finished, pending = wait(pending, timeout=PROGRESS_INTERVAL, return_when=FIRST_COMPLETED)
+                    for f in finished:
+                        r = by_index[futures[f]] = f.result()
+                        last = (r["total_parts_placed"], r["sheet_count"])
+                    report(len(by_index), *last)
+            except BrokenProcessPool:
+                # ワーカーが落ちた（メモリ不足など）。このプールは使えないので捨て、次の計算では作り直す
+                _discard_executor(executor)
+                raise
+            except BaseException:
+                # 待ち中の候補は取り消す（実行中の候補はプロセスの中で最後まで動くが、結果は使わない）
+                for f in futures:
+                    f.cancel()
+                raise
+            computed = [by_index[i] for i in missing]
+    else:
+        computed = []
+        for k, i in enumerate(missing):
+            engine_progress = None
+            if progress is not None:
+                engine_progress = lambda placed, sheets, k=k: report(k, placed, sheets)
+            with timed(perf, f"pack:{candidates[i][3]}"):
+                computed.append(func(candidates[i], engine_progress))
+        report(len(missing))
+    if perf is not None:
+        perf.count("candidates", len(candidates))
+        perf.count("cache_hits", len(candidates) - len(missing))
+        for r in computed:
+            perf.add_counters(r["counters"])
+    for i, r in zip(missing, computed):
+        results[i] = r
+        if cache is not None:
+            cache.put(keys[i], r)
+
+    with timed(perf, "relabel"):
+        results = [_with_names(r, names_by_dims) for r in results]
+    best = min(results, key=rank_key(n_requested))
+    return best, results
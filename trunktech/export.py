@@ -0,0 +1,156 @@
+# パネルソー・CAD 向けの書き出し（切断手順の CSV・DXF）
+# 木取りは段（帯）を下から積み、帯の中に部品を左から並べたギロチン切りなので、
+# 切断手順は「帯を縦挽き（rip）で切り離す → 帯を部品ごとに横切り（cross）→ 帯より低い部品は仕上げ（trim）」になる。
+# どちらも板（またはパターン）ごとの文字列を返すジェネレーターで、write_export でファイルへ順に書き出す
+# （1,000枚の木取りでも、手元に持つのは板1枚分の文字列だけ）。
+# 座標・寸法は鼻切り後の板（SheetLayout の vw x vh）の左下を原点とする mm。
+
+import codecs
+import csv
+import io
+import tempfile
+
+from .svg import format_ids, offcut_title, pattern_name, pattern_title, sheet_title
+
+# 切断手順 CSV の列
+#   pattern: パターン名（by_pattern のとき。先に使った端材は「端材#id」）/ sheet_ids: 板 ID（範囲。端材は空）
+#   repeat: この手順で切る板の枚数
+#   step: 板の中の手順番号 / cut: rip・cross・trim / strip: 帯の番号（下から1始まり）
+#   position: 切断線の位置（rip は板の下端から、cross は帯の左端から、trim は部品の下端から）
+#   length: 切断長 / size: 切り出す幅（rip は帯の幅、cross は部品の長さ、trim は部品の幅）/ part・w・h: 部品
+CUT_COLUMNS = ("pattern", "sheet_ids", "repeat", "step", "cut", "strip", "position", "length", "size", "part", "w", "h")
+
+# DXF の画層と、板を縦に並べるときの間隔（板の短手に対する割合）
+DXF_LAYERS = ("BOARD", "PARTS", "LABELS")
+DXF_SHEET_GAP = 0.25
+
+_EPS = 1e-9
+
+
+def iter_cuts(layout, s):
+    """板 s（0始まり）の切断手順を (cut, strip, position, length, size, 部品名, w, h) で順に返す。
+    帯ごとに「縦挽きで切り離す → 横切り → 仕上げ」の順。板の端まで使い切っている切断は出さない。"""
+    vw, vh = layout.vw, layout.vh
+    names, part_name, part_x, part_w, part_h = layout.names, layout.part_name, layout.part_x, layout.part_w, layout.part_h
+    for k, (y, h, _, a, b) in enumerate(layout.rows(s), 1):
+        if vh - (y + h) > _EPS:
+            yield "rip", k, y + h, vw, h, "", "", ""
+        for i in range(a, b):
+            x, w = part_x[i], part_w[i]
+            if vw - (x + w) > _EPS:
+                yield "cross", k, x + w, h, w, names[part_name[i]], w, part_h[i]
+        for i in range(a, b):
+            if h - part_h[i] > _EPS:
+                yield "trim", k, part_h[i], part_w[i], part_h[i], names[part_name[i]], part_w[i], part_h[i]
+
+
+def _units(best, by_pattern):
+    """書き出す単位 [(SheetLayout, パターン名, 板の添字のリスト, 題)]。by_pattern なら同じ並びの板を1つにまとめる。
+    先に使った端材（best["offcuts"]）があれば、それを「端材#id」として先に並べる。"""
+    layout, label = best["layout"], best["label"]
+    units = [(o["layout"], f"端材#{o['id']}", [0], offcut_title(o)) for o in best.get("offcuts", ())]
+    if by_pattern:
+        groups = layout.patterns()
+        units += [(layout, pattern_name(k), g, pattern_title(layout, k, g, label)) for k, g in enumerate(groups)]
+    else:
+        units += [(layout, "", [s], sheet_title(layout, s, label)) for s in range(layout.sheet_count)]
+    return units
+
+
+def _num(v):
+    return format(round(v, 2), "g") if isinstance(v, float) else v
+
+
+def iter_cut_csv(best, by_pattern=True):
+    """切断手順の CSV を、見出し行 → 板（パターン）ごとの文字列で順に返すジェネレーター。best は {"label", "layout", ...}。"""
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\r\n")
+    writer.writerow(CUT_COLUMNS)
+    yield buf.getvalue()
+    for layout, name, sheets, _ in _units(best, by_pattern):
+        buf.seek(0)
+        buf.truncate()
+        ids = "" if layout is not best["layout"] else format_ids(sheets, max_runs=len(sheets))
+        for step, cut in enumerate(iter_cuts(layout, sheets[0]), 1):
+            writer.writerow((name, ids, len(sheets), step) + tuple(_num(v) for v in cut))
+        yield buf.getvalue()
+
+
+def _dxf(*pairs):
+    """DXF のグループコードと値の組を文字列にする"""
+    return "".join(f"{code}\n{value}\n" for code, value in pairs)
+
+
+def _dxf_rect(layer, x, y, w, h):
+    """閉じた POLYLINE（R12 形式）で長方形を書く"""
+    out = [_dxf((0, "POLYLINE"), (8, layer), (66, 1), (70, 1), (10, 0), (20, 0), (30, 0))]
+    for px, py in ((x, y), (x + w, y), (x + w, y + h), (x, y + h)):
+        out.append(_dxf((0, "VERTEX"), (8, layer), (10, _num(float(px))), (20, _num(float(py))), (30, 0)))
+    out.append(_dxf((0, "SEQEND"), (8, layer)))
+    return "".join(out)
+
+
+def _dxf_text(x, y, height, text, center=True):
+    pos = ((10, _num(float(x))), (20, _num(float(y))), (30, 0))
+    if not center:
+        return _dxf((0, "TEXT"), (8, "LABELS"), *pos, (40, _num(float(height))), (1, text))
+    return _dxf(
+        (0, "TEXT"), (8, "LABELS"), *pos, (40, _num(float(height))), (1, text), (72, 1),
+        (11, _num(float(x))), (21, _num(float(y))), (31, 0), (73, 2),
+    )
+
+
+def iter_dxf(best, by_pattern=True, codepage="ANSI_932"):
+    """木取図の DXF（R12 形式・mm）を、ヘッダー → 板（パターン）ごとの文字列で順に返すジェネレーター。
+    板（先に使った端材を含む）は上から下へ縦に並べ、板の外形は BOARD、部品の長方形は PARTS、
+    題と部品名・寸法は LABELS 画層に書く。
+    codepage は $DWGCODEPAGE（既定は Shift_JIS。write_export の encoding と合わせる）。"""
+    unit = (best["layout"].vw + 2) / 100.0  # 文字の大きさの基準（svg と同じく新しい板の長手の 1%）
+    # R12 には単位の変数（$INSUNITS）が無いので書かない（座標は mm）。
+    # 画層が使う線種 CONTINUOUS と、TEXT が使う文字スタイル STANDARD は表に定義しておく（厳密な読み手のため）
+    yield _dxf(
+        (0, "SECTION"), (2, "HEADER"), (9, "$ACADVER"), (1, "AC1009"), (9, "$DWGCODEPAGE"), (3, codepage),
+        (0, "ENDSEC"),
+        (0, "SECTION"), (2, "TABLES"),
+        (0, "TABLE"), (2, "LTYPE"), (70, 1),
+        (0, "LTYPE"), (2, "CONTINUOUS"), (70, 0), (3, "Solid line"), (72, 65), (73, 0), (40, 0.0),
+        (0, "ENDTAB"),
+        (0, "TABLE"), (2, "STYLE"), (70, 1),
+        (0, "STYLE"), (2, "STANDARD"), (70, 0), (40, 0.0), (41, 1.0), (50, 0.0), (71, 0), (42, 2.5),
+        (3, "txt"), (4, ""),
+        (0, "ENDTAB"),
+        (0, "TABLE"), (2, "LAYER"), (70, len(DXF_LAYERS)),
+    ) + "".join(
+        _dxf((0, "LAYER"), (2, layer), (70, 0), (62, color), (6, "CONTINUOUS"))
+        for layer, color in zip(DXF_LAYERS, (1, 7, 3))
+    ) + _dxf((0, "ENDTAB"), (0, "ENDSEC"), (0, "SECTION"), (2, "ENTITIES"))
+    oy = 0.0
+    for layout, _, sheets, title in _units(best, by_pattern):
+        v_w_full, v_h_full = layout.vw + 2, layout.vh + 2
+        out = [
+            _dxf_rect("BOARD", 0, oy, v_w_full, v_h_full),
+            _dxf_text(0, oy + v_h_full + unit * 1.5, unit * 2.6, title, center=False),
+        ]
+        for n, x, y, w, h in layout.parts(sheets[0]):
+            out.append(_dxf_rect("PARTS", x, oy + y, w, h))
+            out.append(_dxf_text(x + w / 2, oy + y + h / 2, unit * 1.6, f"{n} {int(w)}x{int(h)}"))
+        yield "".join(out)
+        oy -= v_h_full * (1 + DXF_SHEET_GAP) + unit * 4
+    yield _dxf((0, "ENDSEC"), (0, "EOF"))
+
+
+def write_export(chunks, f=None, encoding="utf-8", perf=None):
+    """iter_cut_csv / iter_dxf の文字列を順に f へ書き出す（encoding で符号化し、表せない文字は ? にする）。
+    f を省略すると一時ファイルに書き、先頭に戻して返す（ダウンロード用）。"""
+    out = tempfile.TemporaryFile() if f is None else f
+    encoder = codecs.getincrementalencoder(encoding)(errors="replace")  # utf-8-sig の BOM は先頭に1回だけ
+    nbytes = 0
+    for chunk in chunks:
+        data = encoder.encode(chunk)
+        out.write(data)
+        nbytes += len(data)
+    if perf is not None:
+        perf.count("export_bytes", nbytes)
+    if f is None:
+        out.seek(0)
+    return out
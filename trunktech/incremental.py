@@ -0,0 +1,165 @@
+# 切板リストの一部だけが変わったときの差分再計算
+# 前回の配置から「減った部品」を取り除いて段を詰め、「増えた部品」と空きの多い板（最後の板・充填率の低い板）の
+# 部品だけを、残した板の空き → 新しい板の順に first-fit で置き直す。
+# 残した板はそのままなので、木取図の描画キャッシュもそのまま使える。
+# 板枚数が下限からどれだけ離れたか（前回より悪くなっていないか）を見て、悪ければ None を返す（全体を計算し直す）。
+
+from .engine import ORDERS, TrunkTechEngine, _sort_key
+from .optimize import sheet_lower_bound
+
+# 変わった部品がこれ以上の割合なら差分では計算しない（全体の再計算の方が良い配置になりやすい）
+MAX_CHANGED_RATIO = 0.25
+
+# 充填率（部品面積 / 板面積）がこれ未満の板は残さず、部品を置き直す（空きを詰めて板を減らせるように）
+RELEASE_UTILIZATION = 0.8
+
+
+def part_counts(groups):
+    """prepare_parts 済みの groups を {(名称, w, d): 個数} にする（入力順）。"""
+    counts = {}
+    for g in groups:
+        key = (g["n"], g["w"], g["d"])
+        counts[key] = counts.get(key, 0) + g["qty"]
+    return counts
+
+
+def layout_counts(layout):
+    """SheetLayout に置かれている部品を {(名称, w, d): 個数} にする。"""
+    counts = {}
+    names = layout.names
+    for n, w, h in zip(layout.part_name, layout.part_w, layout.part_h):
+        key = (names[n], w, h)
+        counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+def diff_counts(old, new):
+    """(減った {key: 個数}, 増えた {key: 個数})。増えた方は new の順番のまま。"""
+    removed = {k: q - new.get(k, 0) for k, q in old.items() if q > new.get(k, 0)}
+    added = {k: q - old.get(k, 0) for k, q in new.items() if q > old.get(k, 0)}
+    return removed, added
+
+
+def _compact_sheet(sheet, kerf):
+    """部品を抜いた板の段を左・下へ詰め直す（空いた段は消し、段の高さは残った部品の最大に縮める）。
+    段の中・段どうしの並び順は変えないので、元の配置と同じ切り方（ギロチン切り）のまま。"""
+    rows = []
+    y = 0
+    for r in sheet["rows"]:
+        if not r["parts"]:
+            continue
+        x = 0
+        parts = []
+        for n, _, w, d in r["parts"]:
+            parts.append((n, x, w, d))
+            x += w + kerf
+        h = max(d for _, _, _, d in parts)
+        rows.append({"y": y, "h": h, "used_w": x, "parts": parts})
+        y += h + kerf
+    sheet["rows"] = rows
+    sheet["used_h"] = y
+
+
+def remove_parts(sheets, names, removed, kerf):
+    """作業用表現の sheets から removed の部品を後ろの板から順に抜き、抜いた板だけ詰め直す。
+    部品が無くなった板は消す。戻り値: (残った板のリスト, 詰め直した板の数, 消した板の数)"""
+    name_index = {n: i for i, n in enumerate(names)}
+    want = {(name_index[n], w, d): q for (n, w, d), q in removed.items() if n in name_index}
+    touched = set()
+    for i in range(len(sheets) - 1, -1, -1):
+        if not want:
+            break
+        sheet = sheets[i]
+        for r in reversed(sheet["rows"]):
+            keep = []
+            for p in reversed(r["parts"]):
+                key = (p[0], p[2], p[3])
+                if want.get(key):
+                    want[key] -= 1
+                    if not want[key]:
+                        del want[key]
+                    touched.add(i)
+                else:
+                    keep.append(p)
+            if len(keep) != len(r["parts"]):
+                r["parts"] = keep[::-1]
+    for i in touched:
+        _compact_sheet(sheets[i], kerf)
+    kept = [s for s in sheets if s["rows"]]
+    return kept, len(touched), len(sheets) - len(kept)
+
+
+def release_sheets(sheets, names, vw, vh, min_utilization=RELEASE_UTILIZATION):
+    """最後の板と充填率が min_utilization 未満の板を外し、(残す板, 外した板の部品 {(名称, w, d): 個数}) を返す。"""
+    area = vw * vh
+    kept, released = [], {}
+    last = len(sheets) - 1
+    for i, s in enumerate(sheets):
+        used = sum(w * d for r in s["rows"] for _, _, w, d in r["parts"])
+        if i < last and used >= min_utilization * area:
+            kept.append(s)
+            continue
+        for r in s["rows"]:
+            for n, _, w, d in r["parts"]:
+                key = (names[n], w, d)
+                released[key] = released.get(key, 0) + 1
+    return kept, released
+
+
+def repack_incremental(engine, layout, parts, order="wd", max_changed_ratio=MAX_CHANGED_RATIO, slack=0,
+                       min_utilization=RELEASE_UTILIZATION):
+    """layout（前回の結果）を parts（新しい切板リスト）に合わせて差分で作り直す。
+    戻り値: (SheetLayout または None, info)。None のときは全体を計算し直すこと（info["reason"] に理由）。
+    受け入れ条件: 板枚数と下限（sheet_lower_bound）の差が、前回の差 + slack 以下。
+    info: {"accepted", "reason", "removed", "added", "sheets_kept", "sheets_touched", "sheets_released",
+           "lower_bound", "sheet_count"}"""
+    vw, vh, kerf = layout.vw, layout.vh, engine.kerf
+    groups = engine.prepare_parts(parts, vw, vh)
+    old = layout_counts(layout)
+    removed, added = diff_counts(old, part_counts(groups))
+    n_removed, n_added = sum(removed.values()), sum(added.values())
+    total = sum(g["qty"] for g in groups)
+    info = {"accepted": False, "reason": "", "removed": n_removed, "added": n_added}
+    if n_removed + n_added > max_changed_ratio * max(total, 1):
+        info["reason"] = "too_many_changes"
+        return None, info
+
+    sheets, touched, _ = remove_parts(layout.to_work_sheets(), layout.names, removed, kerf)
+    kept, pool = release_sheets(sheets, layout.names, vw, vh, min_utilization)
+    for key, q in added.items():
+        pool[key] = pool.get(key, 0) + q
+    new_groups = [{"n": n, "w": w, "d": d, "qty": q} for (n, w, d), q in pool.items()]
+    new_groups.sort(key=_sort_key(order, kerf), reverse=True)
+    result = engine.pack_in_order(new_groups, vw, vh, sheets=kept, names=layout.names)
+
+    old_groups = [{"n": n, "w": w, "d": d, "qty": q} for (n, w, d), q in old.items()]
+    lb_old = sheet_lower_bound(old_groups, vw, vh, kerf) if old_groups else 0
+    lb_new = sheet_lower_bound(groups, vw, vh, kerf)
+    info.update({
+        "sheets_kept": len(kept), "sheets_touched": touched, "sheets_released": len(sheets) - len(kept),
+        "lower_bound": lb_new, "sheet_count": result.sheet_count,
+    })
+    if result.sheet_count - lb_new > layout.sheet_count - lb_old + slack:
+        info["reason"] = "quality"
+        return None, info
+    info["accepted"] = True
+    return result, info
+
+
+def repack_result(prev, parts, kerf, **kwargs):
+    """evaluate_candidates の結果 prev（"layout", "label", "vw", "vh", "order" を持つ dict）を
+    parts に合わせて差分で作り直した結果を返す。差分で作れなければ None（info は返り値の "incremental"）。"""
+    engine = TrunkTechEngine(kerf=kerf)
+    order = prev.get("order", "wd")
+    if order not in ORDERS:
+        order = "wd"  # 最適化（pack_anytime）で探した並び（"search"）は並べ順の名前ではないので従来の順にする
+    layout, info = repack_incremental(engine, prev["layout"], parts, order, **kwargs)
+    if layout is None:
+        return None
+    vw, vh = prev["vw"], prev["vh"]
+    return {
+        "label": prev["label"], "layout": layout, "sheet_count": layout.sheet_count,
+        "vw": vw, "vh": vh, "score": layout.sheet_count * (vw * vh),
+        "total_parts_placed": layout.part_count, "order": order,
+        "incremental": info, "counters": engine.counters,
+    }
@@ -0,0 +1,195 @@
+# 切板リストの取り込み（表 → エンジンに渡す部品リスト）
+# 行ごとのループではなく pandas / NumPy の列演算で、型・寸法・枚数を検査し、長辺/短辺をそろえ、
+# 定尺に収まらない部品に印を付け、同じ (名称, 長辺, 短辺) をまとめた部品リストを作る。
+# CSV / Excel のファイルはチャンクに分けて読み、チャンクごとにまとめてから足し合わせる（全行をメモリに載せない）。
+# pandas・openpyxl は重いので、使うときに読み込む（trunktech の import だけでは読み込まない）。
+
+# 列名（アプリの表と同じ日本語名・英語名どちらでも読める）
+COLUMN_ALIASES = {
+    "n": ("名称", "n", "name"),
+    "w": ("幅", "w", "width"),
+    "d": ("奥行", "d", "depth"),
+    "qty": ("枚数", "qty", "quantity"),
+}
+
+# 1行の枚数の上限。これを超える行は打ち間違い（1e9 など）とみなして "qty_large" で読み飛ばす
+# （同じ部品だけの板を枚数分作るので、桁違いの枚数はメモリを使い切る）
+MAX_QTY = 100000
+
+# 読み飛ばした行の理由（表示用）
+REASONS = {
+    "name": "名称が空",
+    "dims": "幅・奥行が数値でない",
+    "nonpositive": "幅・奥行が 0 以下",
+    "dims_inf": "幅・奥行が無限大",
+    "qty": "枚数が数値でない",
+    "qty_large": f"枚数が {MAX_QTY:,} を超える",
+    "qty_int": "枚数が整数でない",
+    "qty_negative": "枚数が負",
+}
+
+# 読み飛ばした行・定尺超えの行は、表示用にこの件数まで残す（件数の合計は別に数える）
+MAX_REPORT_ROWS = 1000
+
+CHUNK_ROWS = 50000
+
+
+def _column(df, key):
+    for col in COLUMN_ALIASES[key]:
+        if col in df.columns:
+            return df[col]
+    return None
+
+
+def normalize_frame(df, row_offset=0):
+    """表（名称・幅・奥行・枚数）を検査して、列 行・名称・w（長辺）・d（短辺）・qty・reason を持つ表を返す。
+    reason は読み飛ばす理由のキー（REASONS）で、正常な行は空文字。枚数 0 の行は使わないだけで理由は付けない。
+    行 は元の表の何行目か（1始まり、row_offset を足す）。"""
+    import numpy as np
+    import pandas as pd
+
+    n_rows = len(df)
+    empty = pd.Series([None] * n_rows, index=df.index, dtype="object")
+
+    def column(key):
+        col = _column(df, key)
+        return empty if col is None else col
+
+    name = column("n").astype("string").str.strip()
+    w = pd.to_numeric(column("w"), errors="coerce")
+    d = pd.to_numeric(column("d"), errors="coerce")
+    qty = pd.to_numeric(column("qty"), errors="coerce")
+
+    w_arr, d_arr, q_arr = w.to_numpy("float64"), d.to_numpy("float64"), qty.to_numpy("float64")
+    reason = np.select(
+        [
+            (name.isna() | (name == "")).to_numpy(bool),
+            np.isnan(w_arr) | np.isnan(d_arr),
+            (w_arr <= 0) | (d_arr <= 0),
+            ~np.isfinite(w_arr) | ~np.isfinite(d_arr),
+            np.isnan(q_arr),
+            ~np.isfinite(q_arr) | (q_arr > MAX_QTY),
+            q_arr != np.floor(q_arr),
+            q_arr < 0,
+        ],
+        ["name", "dims", "nonpositive", "dims_inf", "qty", "qty_large", "qty_int", "qty_negative"],
+        default="",
+    )
+    # 枚数は読み飛ばす行を 0 にしてから整数にする（無限大・桁あふれの値を int64 にしない）
+    q_int = np.where(reason == "", q_arr, 0.0).astype("int64")
+    return pd.DataFrame({
+        "行": np.arange(1, n_rows + 1) + row_offset,
+        "名称": name.to_numpy(object),
+        "w": np.fmax(w_arr, d_arr),
+        "d": np.fmin(w_arr, d_arr),
+        "qty": q_int,
+        "reason": reason,
+    })
+
+
+def _fits_any(frame, boards):
+    """boards [(vw, vh, 表示名), ...] のどれかに収まる行は True"""
+    import numpy as np
+
+    fits = np.zeros(len(frame), dtype=bool)
+    w, d = frame["w"].to_numpy(), frame["d"].to_numpy()
+    for vw, vh, _ in boards:
+        fits |= (w <= vw) & (d <= vh)
+    return fits
+
+
+def new_result():
+    """ingest_frame / ingest_chunks の結果（足し合わせ用の入れ物）"""
+    return {
+        "counts": {},  # (名称, w, d) → 枚数（最初に出てきた順）
+        "rows": 0,  # 読んだ行数
+        "rejected_count": 0,
+        "rejected": [],  # 読み飛ばした行（MAX_REPORT_ROWS まで）: {"行", "名称", "理由"}
+        "oversize_count": 0,
+        "oversize": [],  # どの定尺にも収まらない行（MAX_REPORT_ROWS まで）: {"行", "名称", "幅", "奥行", "枚数"}
+    }
+
+
+def ingest_frame(df, boards=(), result=None, row_offset=0):
+    """表1つ（またはチャンク1つ）を取り込んで result に足す。戻り値は result。
+    boards を渡すと、どれにも収まらない部品を "oversize" に入れる（部品リストには残す。エンジンが配置しない）。"""
+    result = new_result() if result is None else result
+    frame = normalize_frame(df, row_offset)
+    result["rows"] += len(frame)
+    bad = frame["reason"] != ""
+    if bad.any():
+        result["rejected_count"] += int(bad.sum())
+        room = MAX_REPORT_ROWS - len(result["rejected"])
+        if room > 0:
+            for row, name, reason in frame.loc[bad, ["行", "名称", "reason"]].head(room).itertuples(index=False):
+                result["rejected"].append({"行": int(row), "名称": name, "理由": REASONS[reason]})
+    ok = frame[~bad & (frame["qty"] > 0)]
+    if boards and len(ok):
+        over = ok[~_fits_any(ok, boards)]
+        if len(over):
+            result["oversize_count"] += len(over)
+            room = MAX_REPORT_ROWS - len(result["oversize"])
+            for row, name, w, d, q in over[["行", "名称", "w", "d", "qty"]].head(max(room, 0)).itertuples(index=False):
+                result["oversize"].append({"行": int(row), "名称": name, "幅": w, "奥行": d, "枚数": int(q)})
+    if len(ok):
+        grouped = ok.groupby(["名称", "w", "d"], sort=False)["qty"].sum()
+        counts = result["counts"]
+        for key, q in zip(grouped.index, grouped.to_numpy()):
+            counts[key] = counts.get(key, 0) + int(q)
+    return result
+
+
+def ingest_chunks(chunks, boards=()):
+    """DataFrame のチャンクを順に取り込む（read_cut_list の戻り値などを渡す）。"""
+    result = new_result()
+    for chunk in chunks:
+        ingest_frame(chunk, boards, result, row_offset=result["rows"])
+    return result
+
+
+def result_parts(result):
+    """取り込み結果をエンジンに渡す部品リスト [{"n", "w", "d", "qty"}] にする。"""
+    return [{"n": n, "w": float(w), "d": float(d), "qty": q} for (n, w, d), q in result["counts"].items()]
+
+
+def result_frame(result):
+    """取り込み結果をアプリの表（名称・幅・奥行・枚数）にする。"""
+    import pandas as pd
+
+    return pd.DataFrame(
+        [(n, float(w), float(d), q) for (n, w, d), q in result["counts"].items()],
+        columns=["名称", "幅", "奥行", "枚数"],
+    )
+
+
+def read_cut_list(file, filename, encoding="utf-8-sig", chunk_rows=CHUNK_ROWS):
+    """CSV / Excel（.xlsx / .xlsm）の切板リストを chunk_rows 行ずつの DataFrame で順に返す。
+    file はパスでもファイルオブジェクト（Streamlit の UploadedFile など）でもよい。
+    Excel は openpyxl の read_only モードで1行ずつ読む（先頭のシート・1行目が列名）。"""
+    import pandas as pd
+
+    if str(filename).lower().endswith((".xlsx", ".xlsm")):
+        try:
+            import openpyxl
+        except ImportError:
+            raise ImportError("Excel の読み込みには openpyxl が必要です（pip install openpyxl）")
+        wb = openpyxl.load_workbook(file, read_only=True, data_only=True)
+        try:
+            rows = wb.worksheets[0].iter_rows(values_only=True)
+            header = [str(c).strip() if c is not None else "" for c in next(rows, ())]
+            chunk = []
+            for row in rows:
+                chunk.append(row[:len(header)])
+                if len(chunk) >= chunk_rows:
+                    yield pd.DataFrame(chunk, columns=header)
+                    chunk = []
+            if chunk:
+                yield pd.DataFrame(chunk, columns=header)
+        finally:
+            wb.close()
+    else:
+        reader = pd.read_csv(file, encoding=encoding, chunksize=chunk_rows, dtype=str, skipinitialspace=True)
+        with reader:
+            for chunk in reader:
+                chunk.columns = [str(c).strip() for c in chunk.columns]
+                yield chunk
@@ -0,0 +1,128 @@
+# 木取りのバックグラウンド実行
+# 重い計算を Streamlit のスクリプト実行スレッドから外し、共有のスレッドプールで動かす。
+# 同時に走るジョブ数はプールの大きさで抑える（それ以上は "queued" で順番を待つ）。
+# ジョブ関数は job を第1引数に受け取り、job.report(...) で進み具合を書き込む。
+# job.report は取り消されていれば JobCancelled を投げるので、こまめに呼べばそこで止まる。
+
+import itertools
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+# 同時に実行するジョブ数の既定値（環境変数 ITADORI_MAX_JOBS で変更可）
+DEFAULT_MAX_JOBS = int(os.environ.get("ITADORI_MAX_JOBS", 0)) or max(1, (os.cpu_count() or 2) // 2)
+
+
+class JobCancelled(Exception):
+    """job.cancel() されたジョブの中で投げられる"""
+
+
+class Job:
+    """1件のジョブの状態。status は queued / running / done / cancelled / error。
+    progress はジョブ関数が report で書き込む dict（画面の表示用）、partial は途中の結果（任意）。"""
+
+    __slots__ = (
+        "id", "label", "status", "progress", "partial", "result", "error",
+        "created", "started", "finished", "future", "_cancel", "_done",
+    )
+
+    def __init__(self, job_id, label=""):
+        self.id = job_id
+        self.label = label
+        self.status = "queued"
+        self.progress = {}
+        self.partial = None
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.future = None
+        self._cancel = threading.Event()
+        self._done = threading.Event()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    @property
+    def cancel_requested(self):
+        return self._cancel.is_set()
+
+    def cancel(self):
+        """取り消しを頼む。待ち中ならすぐ取り消し、実行中なら次の report で止まる。"""
+        self._cancel.set()
+        if self.future is not None and self.future.cancel():
+            self._finish("cancelled")
+
+    def check(self):
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def report(self, **progress):
+        """進み具合を更新する（取り消されていれば JobCancelled）。"""
+        self.check()
+        self.progress = {**self.progress, **progress}
+
+    def wait(self, timeout=None):
+        """終わるまで（最大 timeout 秒）待ち、終わっていれば True"""
+        return self._done.wait(timeout)
+
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+    def _finish(self, status):
+        self.status = status
+        self.finished = time.time()
+        self._done.set()
+
+
+class JobManager:
+    """ジョブを共有のスレッドプールで実行する（全セッションで1つ使う）。"""
+
+    def __init__(self, max_concurrent=None):
+        self.max_concurrent = max_concurrent or DEFAULT_MAX_JOBS
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrent, thread_name_prefix="trunktech-job")
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._jobs = {}
+
+    def submit(self, func, *args, label="", **kwargs):
+        """func(job, *args, **kwargs) を実行するジョブを作って返す。戻り値が job.result になる。"""
+        job = Job(next(self._ids), label)
+        with self._lock:
+            self._jobs[job.id] = job
+        job.future = self._executor.submit(self._run, job, func, args, kwargs)
+        job.future.add_done_callback(lambda _: self._forget(job))
+        return job
+
+    def _forget(self, job):
+        with self._lock:
+            self._jobs.pop(job.id, None)
+
+    def _run(self, job, func, args, kwargs):
+        if job.cancel_requested:
+            job._finish("cancelled")
+            return
+        job.status = "running"
+        job.started = time.time()
+        try:
+            job.result = func(job, *args, **kwargs)
+        except JobCancelled:
+            job._finish("cancelled")
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+            traceback.print_exc()
+            job._finish("error")
+        else:
+            job._finish("done")
+
+    def stats(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        running = sum(1 for j in jobs if j.status == "running")
+        return {"running": running, "queued": len(jobs) - running, "max_concurrent": self.max_concurrent}
@@ -0,0 +1,166 @@
+# 木取り結果の省メモリ表現（SheetLayout）
+
+import hashlib
+from array import array
+
+
+class SheetLayout:
+    """木取り結果（板 → 段 → 部品）を列ごとの配列で持つ省メモリ表現。
+    部品1個あたり dict ではなく配列の数要素で済み、段・部品は板ごとに連続して並ぶ。
+    板 ID は添字 + 1。旧形式（dict のリスト）が必要な場合は to_dicts() を使う。"""
+
+    __slots__ = (
+        "vw", "vh", "names", "sheet_used_h",
+        "row_start", "row_y", "row_h", "row_used_w",
+        "part_start", "part_x", "part_w", "part_h", "part_name",
+    )
+
+    def __init__(self, vw, vh, names, sheets):
+        """sheets: エンジン内部の作業用表現 [{"used_h", "rows": [{"y", "h", "used_w", "parts": [(名前番号, x, w, h)]}]}]"""
+        self.vw = vw
+        self.vh = vh
+        self.names = tuple(names)
+        self.sheet_used_h = array("d")
+        self.row_start = array("l", [0])
+        self.row_y = array("d")
+        self.row_h = array("d")
+        self.row_used_w = array("d")
+        self.part_start = array("l", [0])
+        self.part_x = array("d")
+        self.part_w = array("d")
+        self.part_h = array("d")
+        self.part_name = array("l")
+        for s in sheets:
+            self.sheet_used_h.append(s["used_h"])
+            for r in s["rows"]:
+                self.row_y.append(r["y"])
+                self.row_h.append(r["h"])
+                self.row_used_w.append(r["used_w"])
+                for n, x, w, h in r["parts"]:
+                    self.part_name.append(n)
+                    self.part_x.append(x)
+                    self.part_w.append(w)
+                    self.part_h.append(h)
+                self.part_start.append(len(self.part_x))
+            self.row_start.append(len(self.row_y))
+
+    @property
+    def sheet_count(self):
+        return len(self.sheet_used_h)
+
+    @property
+    def part_count(self):
+        return len(self.part_x)
+
+    def __len__(self):
+        return self.sheet_count
+
+    def sheet_part_count(self, s):
+        return self.part_start[self.row_start[s + 1]] - self.part_start[self.row_start[s]]
+
+    def rows(self, s):
+        """板 s（0始まり）の段を (y, h, used_w, 部品開始, 部品終了) で順に返す。"""
+        for r in range(self.row_start[s], self.row_start[s + 1]):
+            yield self.row_y[r], self.row_h[r], self.row_used_w[r], self.part_start[r], self.part_start[r + 1]
+
+    def parts(self, s):
+        """板 s（0始まり）の部品を (名称, x, y, w, h) で順に返す。"""
+        names, row_y, part_start = self.names, self.row_y, self.part_start
+        for r in range(self.row_start[s], self.row_start[s + 1]):
+            a, b = part_start[r], part_start[r + 1]
+            y = row_y[r]
+            for n, x, w, h in zip(self.part_name[a:b], self.part_x[a:b], self.part_w[a:b], self.part_h[a:b]):
+                yield names[n], x, y, w, h
+
+    def used_area(self):
+        return sum(w * h for w, h in zip(self.part_w, self.part_h))
+
+    def nbytes(self):
+        """配列部分のおおよそのメモリ量（バイト）"""
+        arrays = (getattr(self, k) for k in self.__slots__[3:])
+        return sum(a.itemsize * len(a) for a in arrays) + sum(len(n.encode("utf-8")) for n in self.names)
+
+    def sheet_digest(self, s):
+        """板 s の並び（段・部品の座標と名前）のハッシュ。描画キャッシュなどのキーに使う。
+        並びが同じなら板番号が違っても同じ値になる。"""
+        r0, r1 = self.row_start[s], self.row_start[s + 1]
+        p0, p1 = self.part_start[r0], self.part_start[r1]
+        h = hashlib.sha1()
+        h.update(repr((self.vw, self.vh, self.sheet_used_h[s])).encode())
+        for col in (self.row_y, self.row_h, self.row_used_w):
+            h.update(col[r0:r1].tobytes())
+        h.update(array("l", (k - p0 for k in self.part_start[r0:r1 + 1])).tobytes())
+        for col in (self.part_x, self.part_w, self.part_h):
+            h.update(col[p0:p1].tobytes())
+        h.update("\0".join(self.names[n] for n in self.part_name[p0:p1]).encode("utf-8"))
+        return h.hexdigest()
+
+    def patterns(self):
+        """同じ並び（sheet_digest が同じ）の板をまとめる。
+        戻り値: [[板の添字, ...], ...]（パターンは最初に出てくる板の順、中の板は昇順）"""
+        groups = {}
+        for s in range(self.sheet_count):
+            groups.setdefault(self.sheet_digest(s), []).append(s)
+        return list(groups.values())
+
+    def digest(self):
+        """結果全体（板寸法・全部の配列・名前）のハッシュ。内容が同じ結果を1つにまとめるキーに使う。"""
+        arrays = [getattr(self, k) for k in self.__slots__[3:]]
+        h = hashlib.sha1()
+        h.update(repr((self.vw, self.vh, [len(a) for a in arrays])).encode())
+        for a in arrays:
+            h.update(a.tobytes())
+        h.update("\0".join(self.names).encode("utf-8"))
+        return h.hexdigest()
+
+    def relabel(self, names_by_dims):
+        """部品名だけを付け替えた SheetLayout を返す（座標の配列は共有する）。
+        names_by_dims: {(w, d): [(名称, 個数), ...]}。同じ寸法の部品に、板・段・左からの順で名前を割り当てる。"""
+        out = object.__new__(SheetLayout)
+        for k in self.__slots__:
+            setattr(out, k, getattr(self, k))
+        names = {}
+        runs = {dims: iter(seq) for dims, seq in names_by_dims.items()}
+        current = {}  # 寸法 → [名前番号, 残り個数]
+        part_name = array("l")
+        for w, h in zip(self.part_w, self.part_h):
+            cur = current.get((w, h))
+            while cur is None or cur[1] <= 0:
+                n, qty = next(runs[(w, h)])
+                cur = current[(w, h)] = [names.setdefault(n, len(names)), qty]
+            part_name.append(cur[0])
+            cur[1] -= 1
+        out.names = tuple(names)
+        out.part_name = part_name
+        return out
+
+    def to_work_sheets(self):
+        """エンジン内部の作業用表現（__init__ の sheets と同じ形）に戻す。
+        TrunkTechEngine.pack_in_order(sheets=...) に渡して、この結果に部品を追加するときに使う。"""
+        sheets = []
+        part_name, part_x, part_w, part_h = self.part_name, self.part_x, self.part_w, self.part_h
+        for s in range(self.sheet_count):
+            rows = [
+                {"y": y, "h": h, "used_w": used_w,
+                 "parts": list(zip(part_name[a:b], part_x[a:b], part_w[a:b], part_h[a:b]))}
+                for y, h, used_w, a, b in self.rows(s)
+            ]
+            sheets.append({"used_h": self.sheet_used_h[s], "rows": rows})
+        return sheets
+
+    def to_dicts(self):
+        """従来の pack_sheets と同じ dict のリスト（板 → 段 → 部品）を作る。互換用。"""
+        sheets = []
+        names = self.names
+        for s in range(self.sheet_count):
+            rows = []
+            for y, h, used_w, a, b in self.rows(s):
+                rows.append({
+                    "y": y, "h": h, "used_w": used_w,
+                    "parts": [
+                        {"n": names[self.part_name[k]], "x": self.part_x[k], "y": y, "w": self.part_w[k], "h": self.part_h[k]}
+                        for k in range(a, b)
+                    ],
+                })
+            sheets.append({"id": s + 1, "used_h": self.sheet_used_h[s], "rows": rows})
+        return sheets
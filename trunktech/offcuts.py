@@ -0,0 +1,195 @@
+# 端材（残材）の在庫
+# 木取りで残る「段の右端の切れ端」と「板の上側に残る帯」のうち、一定以上の大きさのものを SQLite の在庫に登録し、
+# 次の木取りでは新しい定尺板を開ける前に、入る端材へ先に部品を置く。
+# 端材の寸法は元の板の木目に合わせて w＝長手方向の長さ、d＝短手方向の幅で持つ（部品も長辺を w に置くので回さない）。
+# 在庫は (材料, d, w) の複合索引で引くので、数万件になっても「d 以上・w 以上の最小の端材」は索引の範囲検索で済む。
+
+import math
+import os
+import sqlite3
+import threading
+import time
+
+from .engine import _sort_key
+from .incremental import layout_counts
+
+# 在庫に登録する端材の最小寸法（mm）。これより小さい切れ端は捨てる
+MIN_OFFCUT_W = 300
+MIN_OFFCUT_D = 100
+
+# 1回の木取りで使う端材の上限（端材ごとに木取図が1枚増えるので、多すぎると現場で扱いにくい）
+MAX_OFFCUTS_PER_JOB = 50
+
+# 在庫ファイルの既定の場所（環境変数 ITADORI_OFFCUTS で変更可）
+DEFAULT_PATH = os.environ.get(
+    "ITADORI_OFFCUTS",
+    os.path.join(
+        os.environ.get("ITADORI_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "itadori")),
+        "offcuts.sqlite",
+    ),
+)
+
+
+def find_offcuts(layout, min_w=MIN_OFFCUT_W, min_d=MIN_OFFCUT_D):
+    """layout の各板から、使える端材を [(板の添字, w, d), ...] で返す。
+    段の右端（長さ vw - used_w × 段の高さ）と板の上側の帯（vw × vh - used_h）のうち、w >= min_w かつ d >= min_d のもの。
+    used_w・used_h は最後の刃物厚を含むので、どちらも切り離した後の正味の寸法になる。"""
+    out = []
+    vw, vh = layout.vw, layout.vh
+    for s in range(layout.sheet_count):
+        for _, h, used_w, _, _ in layout.rows(s):
+            w = vw - used_w
+            if w >= min_w and h >= min_d:
+                out.append((s, w, h))
+        d = vh - layout.sheet_used_h[s]
+        if vw >= min_w and d >= min_d:
+            out.append((s, vw, d))
+    return out
+
+
+class OffcutInventory:
+    """端材の在庫（SQLite ファイル・スレッドセーフ）。material（材料名）ごとに分けて持つ。
+    複数のプロセスから同じファイルを使ってよい（取り出しは claim で1件ずつ排他的に消す）。"""
+
+    def __init__(self, path=None, timeout=30.0):
+        self.path = path or DEFAULT_PATH
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, timeout=timeout, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS offcuts ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, material TEXT NOT NULL, w REAL NOT NULL, d REAL NOT NULL, "
+            "source TEXT, created REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS offcuts_size ON offcuts (material, d, w)")
+        self._db.commit()
+
+    def add(self, material, offcuts, source=""):
+        """端材 [(w, d), ...] を登録し、件数を返す。"""
+        now = time.time()
+        rows = [(material, float(w), float(d), source, now) for w, d in offcuts]
+        with self._lock:
+            self._db.executemany("INSERT INTO offcuts (material, w, d, source, created) VALUES (?, ?, ?, ?, ?)", rows)
+            self._db.commit()
+        return len(rows)
+
+    def find(self, material, w, d, exclude=()):
+        """w x d の部品が入る端材のうち、幅 d が最も小さく、次に長さ w が最も小さいものを (id, w, d) で返す。無ければ None。
+        exclude は除く端材の id（同じ木取りで既に使うと決めたもの）。"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, w, d FROM offcuts WHERE material = ? AND d >= ? AND w >= ? ORDER BY d, w LIMIT ?",
+                (material, d, w, len(exclude) + 1),
+            ).fetchall()
+        for row in rows:
+            if row[0] not in exclude:
+                return row
+        return None
+
+    def claim(self, ids):
+        """端材 ids を在庫から取り出す（全部あれば消して True、1つでも他で使われていれば何もせず False）。"""
+        ids = list(ids)
+        with self._lock:
+            try:
+                self._db.execute("BEGIN IMMEDIATE")
+                n = sum(self._db.execute("DELETE FROM offcuts WHERE id = ?", (i,)).rowcount for i in ids)
+                if n < len(ids):
+                    self._db.rollback()
+                    return False
+                self._db.commit()
+                return True
+            except BaseException:
+                self._db.rollback()
+                raise
+
+    def count(self, material=None):
+        with self._lock:
+            if material is None:
+                return self._db.execute("SELECT COUNT(*) FROM offcuts").fetchone()[0]
+            return self._db.execute("SELECT COUNT(*) FROM offcuts WHERE material = ?", (material,)).fetchone()[0]
+
+    def list(self, material, limit=100):
+        """material の端材を大きい順に [(id, w, d, source, created), ...] で返す（一覧表示用）。"""
+        with self._lock:
+            return self._db.execute(
+                "SELECT id, w, d, source, created FROM offcuts WHERE material = ? ORDER BY d DESC, w DESC LIMIT ?",
+                (material, limit),
+            ).fetchall()
+
+    def clear(self, material=None):
+        with self._lock:
+            if material is None:
+                self._db.execute("DELETE FROM offcuts")
+            else:
+                self._db.execute("DELETE FROM offcuts WHERE material = ?", (material,))
+            self._db.commit()
+
+
+def pack_offcuts(engine, parts, inventory, material, order="wd", max_offcuts=MAX_OFFCUTS_PER_JOB, claim=False):
+    """新しい板を開ける前に、在庫の端材へ部品を置く。
+    大きい部品から順に「入る端材のうち一番小さいもの」を探し、その端材1枚に残りの部品を first-fit で詰める、を繰り返す。
+    claim=True なら使う端材をその場で在庫から取り出す（他の処理と取り合いになったものは飛ばす）。
+    claim=False なら在庫は変えない（確定するときに claim_and_record を呼ぶ）。
+    戻り値: (使った端材 [{"id", "w", "d", "parts", "layout"}], 残りの部品リスト)。layout は端材1枚の SheetLayout、
+    parts はその端材に置いた部品 ((名称, w, d, 個数), ...)（置いた順。offcut_layout で同じ layout を作り直せる）。"""
+    groups = engine.prepare_parts(parts, math.inf, math.inf)
+    groups.sort(key=_sort_key(order, engine.kerf), reverse=True)
+    remaining = {}
+    for g in groups:
+        key = (g["n"], g["w"], g["d"])
+        remaining[key] = remaining.get(key, 0) + g["qty"]
+    used, taken, no_fit = [], set(), set()
+    while len(used) < max_offcuts:
+        found = None
+        for (_, w, d), q in remaining.items():
+            if q and (w, d) not in no_fit:
+                found = inventory.find(material, w, d, taken)
+                if found is not None:
+                    break
+                no_fit.add((w, d))  # 同じ木取りの中では在庫は減るだけなので、もう探さない
+        if found is None:
+            break
+        oid, ow, od = found
+        taken.add(oid)
+        if claim and not inventory.claim([oid]):
+            continue
+        fit = [{"n": n, "w": w, "d": d, "qty": q} for (n, w, d), q in remaining.items() if q and w <= ow and d <= od]
+        layout = engine.pack_in_order(fit, ow, od, max_sheets=1)
+        placed = layout_counts(layout)
+        for key, q in placed.items():
+            remaining[key] -= q
+        keys = [(g["n"], g["w"], g["d"]) for g in fit]
+        parts = tuple(key + (placed[key],) for key in keys if key in placed)
+        used.append({"id": oid, "w": ow, "d": od, "parts": parts, "layout": layout})
+    rest = [{"n": n, "w": w, "d": d, "qty": q} for (n, w, d), q in remaining.items() if q]
+    return used, rest
+
+
+def offcut_layout(engine, w, d, parts):
+    """pack_offcuts の端材1枚の配置を parts ((名称, w, d, 個数), ...) から作り直す。
+    置けた部品だけを同じ順に first-fit で置くので、置けなかった部品があっても同じ配置になる。"""
+    groups = [{"n": n, "w": pw, "d": pd, "qty": q} for n, pw, pd, q in parts]
+    return engine.pack_in_order(groups, w, d, max_sheets=1)
+
+
+def attach_offcuts(best, used):
+    """evaluate_candidates の結果（残りの部品を新しい板に置いたもの）に、pack_offcuts で使った端材を加える。"""
+    placed = sum(o["layout"].part_count for o in used)
+    return {**best, "offcuts": used, "total_parts_placed": best["total_parts_placed"] + placed}
+
+
+def offcuts_of(best, min_w=MIN_OFFCUT_W, min_d=MIN_OFFCUT_D):
+    """木取り結果（新しい板と、使った端材の残り）から出る端材を [(w, d), ...] で返す。"""
+    out = [(w, d) for _, w, d in find_offcuts(best["layout"], min_w, min_d)]
+    for o in best.get("offcuts", ()):
+        out.extend((w, d) for _, w, d in find_offcuts(o["layout"], min_w, min_d))
+    return out
+
+
+def claim_and_record(inventory, material, best, source="", min_w=MIN_OFFCUT_W, min_d=MIN_OFFCUT_D):
+    """木取りを確定する：使った端材を在庫から取り出し、新しく出る端材を登録する。
+    使う端材が他の木取りで先に使われていれば何もせず None を返す（計算し直すこと）。戻り値は登録した件数。"""
+    if not inventory.claim(o["id"] for o in best.get("offcuts", ())):
+        return None
+    return inventory.add(material, offcuts_of(best, min_w, min_d), source)
@@ -0,0 +1,100 @@
+# 時間指定の木取り改善（anytime 最適化）
+# 貪欲法（TrunkTechEngine.pack_layout）の結果から始め、指定時間内で部品の並べ順を局所探索して
+# 板枚数を減らす。板枚数の下限に達したらその時点で打ち切る。
+
+import math
+import random
+import time
+
+from .engine import ORDERS, _sort_key
+
+
+def sheet_lower_bound(groups, vw, vh, kerf):
+    """prepare_parts 済みの groups を並べるのに最低限必要な板枚数。
+    1) 面積の下限: 部品面積の合計 / 板面積
+    2) 帯の下限: 長手の半分を超える部品どうしは横に並ばないので、短手方向に積むしかない
+       （短辺 + 刃物厚の合計 / (短手 + 刃物厚)）。短手の半分を超える部品も同様に長手方向で数える。
+    の大きい方を返す。"""
+    if not groups:
+        return 0
+    eps = 1e-9
+    area = sum(g["w"] * g["d"] * g["qty"] for g in groups)
+    bound = math.ceil(area / (vw * vh) - eps)
+    wide = sum((g["d"] + kerf) * g["qty"] for g in groups if 2 * g["w"] + kerf > vw)
+    tall = sum((g["w"] + kerf) * g["qty"] for g in groups if 2 * g["d"] + kerf > vh)
+    bound = max(bound, math.ceil(wide / (vh + kerf) - eps), math.ceil(tall / (vw + kerf) - eps))
+    return max(bound, 1)
+
+
+def _cost(layout):
+    """小さいほど良い。板枚数が同じなら最後の板に置いた面積が少ない方（1枚減らしやすい）を選ぶ。"""
+    last = layout.sheet_count - 1
+    last_area = sum(w * h for _, _, _, w, h in layout.parts(last)) if last >= 0 else 0
+    return (layout.sheet_count, last_area)
+
+
+def pack_anytime(engine, parts, vw, vh, budget_ms, seed=0, max_iterations=None):
+    """budget_ms ミリ秒の範囲で並べ順を改善した配置を返す。
+    戻り値: (SheetLayout, info)。info は
+    {"lower_bound", "sheet_count", "greedy_sheet_count", "elapsed_ms", "iterations", "order"}。
+    乱数の種は固定なので、同じ反復回数なら同じ結果になる。
+    max_iterations を渡すとその反復回数で打ち切る（info["iterations"] を渡せば同じ結果を作り直せる）。"""
+    start = time.perf_counter()
+    deadline = start + budget_ms / 1000.0
+    groups = engine.prepare_parts(parts, vw, vh)
+    lb = sheet_lower_bound(groups, vw, vh, engine.kerf)
+
+    order = sorted(groups, key=_sort_key("wd", engine.kerf), reverse=True)
+    best_layout = engine.pack_in_order(order, vw, vh)
+    best_cost = _cost(best_layout)
+    best_order, best_name = order, "wd"
+    greedy_count = best_layout.sheet_count
+    iterations = 0
+
+    def done():
+        if max_iterations is not None and iterations >= max_iterations:
+            return True
+        return best_layout.sheet_count <= lb or time.perf_counter() >= deadline
+
+    # 1) 他の並べ順（貪欲法の変種）を試す
+    for name in ORDERS[1:]:
+        if done():
+            break
+        order = sorted(groups, key=_sort_key(name, engine.kerf), reverse=True)
+        layout = engine.pack_in_order(order, vw, vh)
+        iterations += 1
+        cost = _cost(layout)
+        if cost < best_cost:
+            best_layout, best_cost, best_order, best_name = layout, cost, order, name
+
+    # 2) 最良の並べ順から局所探索（入れ替え・挿し直し・区間反転）。悪化しない手は受け入れる
+    rng = random.Random(seed)
+    current, current_cost = best_order, best_cost
+    n = len(current)
+    while n > 1 and not done():
+        cand = list(current)
+        i, j = sorted(rng.sample(range(n), 2))
+        move = rng.random()
+        if move < 0.4:
+            cand[i], cand[j] = cand[j], cand[i]
+        elif move < 0.8:
+            cand.insert(i, cand.pop(j))
+        else:
+            cand[i:j + 1] = cand[i:j + 1][::-1]
+        layout = engine.pack_in_order(cand, vw, vh)
+        iterations += 1
+        cost = _cost(layout)
+        if cost <= current_cost:
+            current, current_cost = cand, cost
+            if cost < best_cost:
+                best_layout, best_cost, best_name = layout, cost, "search"
+
+    info = {
+        "lower_bound": lb,
+        "sheet_count": best_layout.sheet_count,
+        "greedy_sheet_count": greedy_count,
+        "elapsed_ms": (time.perf_counter() - start) * 1000.0,
+        "iterations": iterations,
+        "order": best_name,
+    }
+    return best_layout, info
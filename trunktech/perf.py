@@ -0,0 +1,93 @@
+# 処理時間・件数の計測（「遅い」と言われたときにどこで時間を使ったかを残す）
+# PerfRecorder を1回の実行（ボタン1回・バッチ1件など）ごとに作り、関数に perf= で渡す。
+# perf=None なら計測しない（timed は何もしない with になる）。
+
+import contextlib
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import time
+
+
+class PerfRecorder:
+    """区間ごとの時間（ms・同じ名前は合計）と件数を集める。"""
+
+    __slots__ = ("name", "started", "phases", "counters")
+
+    def __init__(self, name="run"):
+        self.name = name
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.counters = {}
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        t = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + (time.perf_counter() - t) * 1000
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def add_counters(self, counters):
+        for name, n in counters.items():
+            self.count(name, n)
+
+    def merge(self, other):
+        """other（別のスレッドで使い終わった PerfRecorder）の区間の時間と件数を足し込む"""
+        for name, ms in other.phases.items():
+            self.phases[name] = self.phases.get(name, 0.0) + ms
+        self.add_counters(other.counters)
+
+    def total_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def as_dict(self):
+        return {
+            "run": self.name,
+            "total_ms": round(self.total_ms(), 1),
+            "phases": {k: round(v, 1) for k, v in self.phases.items()},
+            "counters": dict(self.counters),
+        }
+
+    def log_line(self, **extra):
+        """監視用の1行 JSON（キーは固定: run, total_ms, phases, counters ＋ extra）"""
+        return json.dumps({**self.as_dict(), **extra}, ensure_ascii=False, sort_keys=True)
+
+
+def timed(perf, name):
+    """perf があれば perf.phase(name)、無ければ何もしない with を返す"""
+    return perf.phase(name) if perf is not None else contextlib.nullcontext()
+
+
+# cProfile の切り替え（環境変数 ITADORI_PROFILE）
+#   未設定: 何もしない / 1: 上位の関数を標準エラーに出す / それ以外: そのフォルダに .prof も保存する
+# プロセスプールで計算した分は別プロセスなので含まれない（ITADORI_WORKERS=1 で1プロセスにする）
+PROFILE = os.environ.get("ITADORI_PROFILE", "")
+
+
+@contextlib.contextmanager
+def profiled(name, setting=None, top=25):
+    setting = PROFILE if setting is None else setting
+    if not setting:
+        yield
+        return
+    prof = cProfile.Profile()
+    prof.enable()
+    try:
+        yield
+    finally:
+        prof.disable()
+        if setting != "1":
+            os.makedirs(setting, exist_ok=True)
+            path = os.path.join(setting, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}.prof")
+            prof.dump_stats(path)
+            print(f"profile saved: {path}", file=sys.stderr)
+        buf = io.StringIO()
+        pstats.Stats(prof, stream=buf).sort_stats("cumulative").print_stats(top)
+        print(buf.getvalue(), file=sys.stderr)
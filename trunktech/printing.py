@@ -0,0 +1,71 @@
+# 印刷用HTML（A4）の出力
+# ページ単位で作って順に書き出すので、板が何枚あっても手元に持つのは1ページ分だけ。
+
+import base64
+import tempfile
+
+from .render import diagram_items, render_sheet
+from .svg import offcut_title
+
+PRINT_HTML_HEAD = """<!DOCTYPE html><html><head><meta charset="utf-8">
+<style>
+@media print { @page { size: A4; margin: 10mm; } body { margin: 0; } }
+.diagram-page { page-break-after: always; padding: 0; }
+.diagram-page:last-child { page-break-after: auto; }
+.diagram-img { width: 100%; max-height: 32%; object-fit: contain; margin-bottom: 2mm; }
+h1 { font-size: 14pt; margin-bottom: 4mm; }
+</style></head><body>"""
+
+
+def iter_print_html(best, max_per_page=None, renderer="svg", cache=None, perf=None, by_pattern=True):
+    """印刷用HTMLをページ単位の文字列で順に返すジェネレーター。best は {"label", "layout", ...}。
+    木取図の描画もページごとに行う。max_per_page指定時はその枚数でページ分割、未指定時は1枚ずつ1ページ。
+    by_pattern なら同じ並びの板は1枚の図（パターンA ×12 など）にまとめる（diagram_items）。
+    先に使った端材（best["offcuts"]）があれば、その木取図を新しい板より前に並べる。"""
+    label = best["label"]
+    layout = best["layout"]
+    offcuts = best.get("offcuts", ())
+    items = [{"layout": o["layout"], "sheet": 0, "title": offcut_title(o)} for o in offcuts]
+    items += [{"layout": layout, **item} for item in diagram_items(layout, label, by_pattern)]
+    n_patterns = len(items) - len(offcuts)
+    # 固定せず：未指定なら1枚1ページ、指定があればその枚数でまとめる（目安として可変）
+    chunk = max_per_page if max_per_page is not None and max_per_page >= 1 else 1
+    yield PRINT_HTML_HEAD
+    for i, first in enumerate(range(0, len(items), chunk)):
+        html_parts = [f'<div class="diagram-page"><h1>木取図（{label}）— {i+1}ページ目</h1>']
+        if i == 0 and (offcuts or n_patterns < layout.sheet_count):
+            summary = f"板 {layout.sheet_count}枚・木取りパターン {n_patterns}種類"
+            if offcuts:
+                summary += f"・端材 {len(offcuts)}枚"
+            html_parts.append(f"<p>{summary}</p>")
+        for j, item in enumerate(items[first:first + chunk]):
+            img = render_sheet(item["layout"], item["sheet"], label, renderer, cache, perf, item["title"])
+            if isinstance(img, str):
+                html_parts.append(img)  # SVG はそのまま埋め込む（ベクターで印刷される）
+            else:
+                b64 = base64.b64encode(img).decode("utf-8")
+                html_parts.append(f'<img class="diagram-img" src="data:image/png;base64,{b64}" alt="木取図{j+1}"/>')
+        html_parts.append("</div>")
+        yield "".join(html_parts)
+    yield "</body></html>"
+
+
+def build_print_html(best, max_per_page=None, renderer="svg", cache=None, perf=None, by_pattern=True):
+    """木取図を印刷用HTMLに出力（1つの文字列）。大きな木取りでは write_print_html を使う"""
+    return "".join(iter_print_html(best, max_per_page, renderer, cache, perf, by_pattern))
+
+
+def write_print_html(best, max_per_page=None, renderer="svg", cache=None, f=None, perf=None, by_pattern=True):
+    """iter_print_html をファイルへページごとに書き出す。
+    f を省略すると一時ファイルに書き、先頭に戻して返す（ダウンロード用）。"""
+    out = tempfile.TemporaryFile() if f is None else f
+    nbytes = 0
+    for chunk in iter_print_html(best, max_per_page, renderer, cache, perf, by_pattern):
+        data = chunk.encode("utf-8")
+        out.write(data)
+        nbytes += len(data)
+    if perf is not None:
+        perf.count("print_bytes", nbytes)
+    if f is None:
+        out.seek(0)
+    return out
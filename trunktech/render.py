@@ -0,0 +1,238 @@
+# 木取図の描画（Streamlit に依存しない）
+# 既定は SVG（trunktech.svg）。renderer="matplotlib" で従来の matplotlib（PNG）描画。
+# matplotlib と日本語フォントは初めて PNG を描くときに1回だけ読み込む。
+
+import functools
+import io
+import json
+import os
+import sys
+from types import ModuleType
+
+from .svg import pattern_title, render_sheet_svg, sheet_title
+
+SHEET_FIGSIZE = (10, 5)
+SHEET_DPI = 150
+
+# 一覧用の縮小図（部品の文字を省いた低解像度の図）
+THUMB_FIGSIZE = (4, 2)
+THUMB_DPI = 48
+
+# アプリのルート（同梱フォント font/ipaexg.ttf などを探す場所）
+_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 見つけた日本語フォントのパスを覚えておくファイル（次回起動時は候補を探し直さない）
+FONT_CACHE_FILE = os.path.join(
+    os.environ.get("ITADORI_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "itadori")),
+    "font.json",
+)
+
+
+def _japanese_font_candidates():
+    """日本語フォントの候補パス（優先順）
+    1) アプリ同梱: リポジトリの font/IPAexGothic.ttf（GitHub・クラウドで必須）
+    2) Linux: サーバーに入っている Noto CJK 等
+    3) Windows: C:\\Windows\\Fonts の MS ゴシック等"""
+    # 1) リポジトリに同梱したフォント（GitHub プッシュ → クラウドで動く場合はここが有効）
+    # IPAex Ver.004.01 のゴシックは ipaexg.ttf、旧表記は IPAexGothic.ttf
+    app_fonts = [
+        os.path.join(_root, "font", "ipaexg.ttf"),
+        os.path.join(_root, "font", "IPAexGothic.ttf"),
+        os.path.join(_root, "fonts", "ipaexg.ttf"),
+        os.path.join(_root, "fonts", "IPAexGothic.ttf"),
+        os.path.join(_root, "ipaexg.ttf"),
+        os.path.join(_root, "IPAexGothic.ttf"),
+    ]
+    # 2) Linux（Streamlit Cloud 等）でよくあるパス
+    linux_fonts = [
+        "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
+        "/usr/share/fonts/truetype/fonts-japanese-gothic/ttf/IPAexGothic.ttf",
+    ]
+    # 3) Windows の標準フォント（PC で streamlit run する場合）
+    windir = os.environ.get("SystemRoot", os.environ.get("WINDIR", "C:\\Windows"))
+    fonts_dir = os.path.join(windir, "Fonts")
+    win_fonts = [os.path.join(fonts_dir, f) for f in ["msgothic.ttc", "msmincho.ttc", "meiryo.ttc", "yugothm.ttc"]]
+    return app_fonts + linux_fonts + win_fonts
+
+
+def _setup_japanese_font(plt, fm):
+    """木取図（PNG）内の日本語を表示するフォントを用意する。
+    前回見つけたパスが FONT_CACHE_FILE にあればそれだけを試し、無ければ候補を順に探して保存する。
+    戻り値: FontProperties（パス指定）。見つからなければ None。"""
+    def try_path(path):
+        if not path or not os.path.isfile(path):
+            return None
+        try:
+            if hasattr(fm.fontManager, "addfont"):
+                fm.fontManager.addfont(path)
+            prop = fm.FontProperties(fname=path)
+            name = prop.get_name()
+            plt.rcParams["font.sans-serif"] = [name] + [
+                x for x in plt.rcParams["font.sans-serif"] if x != name
+            ]
+            plt.rcParams["font.family"] = "sans-serif"
+            return prop
+        except Exception:
+            return None
+
+    try:
+        with open(FONT_CACHE_FILE, encoding="utf-8") as f:
+            prop = try_path(json.load(f).get("path"))
+        if prop is not None:
+            return prop
+    except (OSError, ValueError):
+        pass
+
+    for path in _japanese_font_candidates():
+        prop = try_path(path)
+        if prop is not None:
+            try:
+                os.makedirs(os.path.dirname(FONT_CACHE_FILE), exist_ok=True)
+                with open(FONT_CACHE_FILE, "w", encoding="utf-8") as f:
+                    json.dump({"path": path}, f)
+            except OSError:
+                pass  # 保存できなくても次回探し直すだけ
+            return prop
+    return None
+
+
+@functools.lru_cache(maxsize=None)
+def load_matplotlib():
+    """matplotlib を初めて使うときに1回だけ（プロセスにつき1回）読み込み、日本語フォントを設定する。
+    戻り値: (pyplot, patches, 図中のテキストで使う FontProperties または None)"""
+    # --- Python 3.12/3.13 互換性パッチ ---
+    if 'distutils' not in sys.modules:
+        d = ModuleType('distutils'); d.version = ModuleType('distutils.version')
+        class LooseVersion:
+            def __init__(self, vstring): self.vstring = vstring
+            def __lt__(self, other): return False
+        d.version.LooseVersion = LooseVersion; sys.modules['distutils'] = d; sys.modules['distutils.version'] = d.version
+
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import matplotlib.patches as patches
+    import matplotlib.font_manager as fm
+    plt.rcParams['font.family'] = 'sans-serif'
+    plt.rcParams['font.sans-serif'] = ['IPAexGothic', 'Noto Sans CJK JP', 'DejaVu Sans']
+    # 図中のテキストで必ず使うフォント（パス指定で確実に表示）
+    return plt, patches, _setup_japanese_font(plt, fm)
+
+
+def _draw_sheet_axes(ax, patches, jp_font, layout, s, label, thumbnail=False, title=None):
+    """ax に layout の s 番目の板を描く（thumbnail なら題は板 ID だけ・部品の文字なし。title で題を指定できる）"""
+    v_w_full, v_h_full = layout.vw + 2, layout.vh + 2
+    ax.set_xlim(0, v_w_full)
+    ax.set_ylim(0, v_h_full)
+    ax.set_aspect("equal")
+    ax.add_patch(patches.Rectangle((0, 0), v_w_full, v_h_full, fc="#fdf5e6", ec="#8b4513", lw=1 if thumbnail else 2))
+    kw_t = {"fontsize": 12, "fontweight": "bold"}
+    if jp_font is not None:
+        kw_t["fontproperties"] = jp_font
+    if thumbnail:
+        ax.set_axis_off()
+        ax.set_title(title or f"ID:{s + 1}", **kw_t)
+        for _, x, y, w, h in layout.parts(s):
+            ax.add_patch(patches.Rectangle((x, y), w, h, lw=0.5, ec="black", fc="#deb887", alpha=0.8))
+        return
+    ax.set_title(title or sheet_title(layout, s, label), **kw_t)
+    kw_txt = {"ha": "center", "va": "center", "fontsize": 9, "fontweight": "bold"}
+    if jp_font is not None:
+        kw_txt["fontproperties"] = jp_font
+    for n, x, y, w, h in layout.parts(s):
+        ax.add_patch(patches.Rectangle((x, y), w, h, lw=1, ec="black", fc="#deb887", alpha=0.8))
+        ax.text(x + w / 2, y + h / 2, f"{n}\n{int(w)}x{int(h)}", **kw_txt)
+
+
+def draw_sheet_png(layout, s, label, title=None):
+    """matplotlib で1枚の木取図（layout の s 番目の板）を描き、PNGバイト列を返す"""
+    plt, patches, _jp_font = load_matplotlib()
+    fig, ax = plt.subplots(figsize=SHEET_FIGSIZE)
+    _draw_sheet_axes(ax, patches, _jp_font, layout, s, label, title=title)
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", dpi=SHEET_DPI, bbox_inches="tight")
+    plt.close(fig)
+    return buf.getvalue()
+
+
+def draw_thumbnails_png(layout, sheets, label, titles=None):
+    """sheets（板の添字）の縮小図を PNGバイト列のリストで返す。図は1つだけ作り、描き直して使い回す。"""
+    plt, patches, _jp_font = load_matplotlib()
+    fig, ax = plt.subplots(figsize=THUMB_FIGSIZE)
+    out = []
+    try:
+        for s, title in zip(sheets, titles or [None] * len(sheets)):
+            ax.cla()
+            _draw_sheet_axes(ax, patches, _jp_font, layout, s, label, thumbnail=True, title=title)
+            buf = io.BytesIO()
+            fig.savefig(buf, format="png", dpi=THUMB_DPI, bbox_inches="tight")
+            out.append(buf.getvalue())
+    finally:
+        plt.close(fig)
+    return out
+
+
+def diagram_items(layout, label, by_pattern=True):
+    """木取図を描く単位のリスト [{"sheet": 描く板, "sheets": 同じ並びの板, "title", "thumb_title"}]。
+    by_pattern で同じ並びの板があればパターンごと（題は「パターンA ×12 ID:1〜12」など）、
+    全部の板の並びが違えば（または by_pattern=False なら）板ごと（題は None ＝ 従来の ID の題）。"""
+    groups = layout.patterns() if by_pattern else None
+    if groups is None or len(groups) == layout.sheet_count:
+        return [{"sheet": s, "sheets": [s], "title": None, "thumb_title": None} for s in range(layout.sheet_count)]
+    return [
+        {"sheet": g[0], "sheets": g, "title": pattern_title(layout, k, g, label),
+         "thumb_title": pattern_title(layout, k, g, label, thumbnail=True)}
+        for k, g in enumerate(groups)
+    ]
+
+
+def _cache_key(layout, s, label, renderer, thumbnail=False, title=None):
+    size = (THUMB_FIGSIZE, THUMB_DPI, "thumb") if thumbnail else (SHEET_FIGSIZE, SHEET_DPI)
+    return (layout.sheet_digest(s), title or s + 1, layout.vw, layout.vh, label, renderer) + size
+
+
+def render_sheet(layout, s, label, renderer="svg", cache=None, perf=None, title=None):
+    """layout の s 番目の板の木取図。SVG 文字列（renderer="matplotlib" なら PNGバイト列）を返す。
+    title を渡すと題をそれにする（diagram_items のパターンの題など）。
+    cache（RenderCache）を渡すと、並び・板寸法・表示名・題・描画方式が同じなら描き直さない。
+    perf（PerfRecorder）には表示した枚数 figures_shown と実際に描いた枚数 figures_rendered を数える。"""
+    def draw():
+        if perf is not None:
+            perf.count("figures_rendered")
+        if renderer == "matplotlib":
+            return draw_sheet_png(layout, s, label, title)
+        return render_sheet_svg(layout, s, label, css_class="diagram-img", title=title)
+
+    if perf is not None:
+        perf.count("figures_shown")
+    if cache is None:
+        return draw()
+    return cache.get_or_render(_cache_key(layout, s, label, renderer, title=title), draw)
+
+
+def render_thumbnails(layout, sheets, label, renderer="svg", cache=None, perf=None, titles=None):
+    """sheets（板の添字）の縮小図をまとめて返す（一覧表示用）。キャッシュに無い分だけを1回で描く。
+    titles（sheets と同じ長さ）で題を指定できる。perf には thumbnails_shown と thumbnails_rendered を数える。"""
+    sheets = list(sheets)
+    titles = list(titles) if titles is not None else [None] * len(sheets)
+    keys = [_cache_key(layout, s, label, renderer, True, t) for s, t in zip(sheets, titles)]
+    images = [cache.get(k) for k in keys] if cache is not None else [None] * len(sheets)
+    missing = [i for i, img in enumerate(images) if img is None]
+    if missing:
+        todo = [sheets[i] for i in missing]
+        todo_titles = [titles[i] for i in missing]
+        if renderer == "matplotlib":
+            drawn = draw_thumbnails_png(layout, todo, label, todo_titles)
+        else:
+            drawn = [
+                render_sheet_svg(layout, s, label, css_class="diagram-thumb", thumbnail=True, title=t)
+                for s, t in zip(todo, todo_titles)
+            ]
+        for i, img in zip(missing, drawn):
+            images[i] = img
+            if cache is not None:
+                cache.put(keys[i], img)
+    if perf is not None:
+        perf.count("thumbnails_shown", len(sheets))
+        perf.count("thumbnails_rendered", len(missing))
+    return images
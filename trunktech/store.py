@@ -0,0 +1,186 @@
+# 木取り結果の置き場（全セッションで共有・メモリ量の上限付き）
+# 結果の重い部分（SheetLayout）は ResultStore に内容のハッシュ（SheetLayout.digest）で1つだけ置き、
+# セッションには小さな「ハンドル」（表示用の数値と、結果を作り直すための入力＝レシピ）だけを持たせる。
+# 同じ切板リストを別の人が計算しても結果は1つにまとまる。合計が上限を超えたら古く使われていないものから捨て、
+# 捨てた結果はハンドルのレシピから計算し直す（同じ入力・同じ並べ順・同じ反復回数なら同じ配置になる）。
+# 先に使った端材（"offcuts"）の配置も同じく置き場に置き、ハンドルには端材ごとの部品（作り直す入力）だけを残す。
+
+import math
+import os
+import threading
+from collections import OrderedDict
+
+from .cache import anonymous_parts, canonical_parts
+from .engine import TrunkTechEngine
+from .incremental import repack_result
+from .offcuts import offcut_layout
+from .optimize import pack_anytime
+
+# 木取り結果まわりのメモリ全体の上限（環境変数 ITADORI_MEMORY_MB、既定 512MB）。
+# 結果の置き場・計算結果のキャッシュ（PackCache）・木取図のキャッシュ（RenderCache）が BUDGET_SHARES の割合で分け合う
+MEMORY_BUDGET = int(os.environ.get("ITADORI_MEMORY_MB", 512)) * 1024 * 1024
+BUDGET_SHARES = {"results": 0.5, "pack_cache": 0.25, "render_cache": 0.25}
+
+
+def budget_bytes(part, total=None):
+    """メモリ全体の上限 total（省略時は MEMORY_BUDGET）のうち part（BUDGET_SHARES のキー）に割り当てるバイト数"""
+    return int((total or MEMORY_BUDGET) * BUDGET_SHARES[part])
+
+
+# 置き場の上限の既定値
+DEFAULT_MAX_BYTES = budget_bytes("results")
+
+# 差分の再計算を続けられる回数。作り直すときは元の結果から順にたどるので、これを超えたら全体を計算する
+MAX_REBUILD_DEPTH = 4
+
+# ハンドルに入れない結果のキー（重いもの・計測用）
+_HEAVY_KEYS = ("layout", "counters")
+
+
+def compact_parts(parts):
+    """部品リスト [{"n", "w", "d", "qty"}] をレシピ用のタプル ((名称, w, d, 枚数), ...) にする。"""
+    return tuple((p["n"], p["w"], p["d"], int(p.get("qty", 1))) for p in parts)
+
+
+def _expand_parts(parts):
+    return [{"n": n, "w": w, "d": d, "qty": q} for n, w, d, q in parts]
+
+
+def make_recipe(result, parts, kerf, base=None):
+    """結果を作り直すための入力。result は evaluate_candidates / repack_result の結果、
+    parts はその計算に渡した部品リスト、base は差分の元にした結果のハンドル（差分の再計算のとき）。"""
+    recipe = {"parts": compact_parts(parts), "kerf": kerf}
+    if "incremental" in result:
+        recipe.update(mode="incremental", base=base, depth=base["recipe"].get("depth", 0) + 1)
+    else:
+        recipe.update(board=(result["vw"], result["vh"], result["label"]), order=result["order"], depth=0)
+        if "optimize" in result:
+            recipe.update(mode="anytime", iterations=result["optimize"]["iterations"])
+        else:
+            recipe["mode"] = "greedy"
+    return recipe
+
+
+def rebuild_layout(recipe, store=None):
+    """レシピから SheetLayout を計算し直す（evaluate_candidates と同じく名前なしで計算してから名前を付ける）。
+    差分の再計算は元の結果を store から取り出して（無ければそれも作り直して）同じ手順で置き直す。"""
+    parts = _expand_parts(recipe["parts"])
+    kerf = recipe["kerf"]
+    if recipe["mode"] == "incremental":
+        base = store.resolve(recipe["base"]) if store is not None else resolve_result(recipe["base"])
+        result = repack_result(base, parts, kerf)
+        if result is None:
+            raise ValueError("差分の再計算で元の結果を作り直せませんでした")
+        return result["layout"]
+    groups, names_by_dims = canonical_parts(parts)
+    vw, vh, _ = recipe["board"]
+    engine = TrunkTechEngine(kerf=kerf)
+    if recipe["mode"] == "anytime":
+        layout, _ = pack_anytime(engine, anonymous_parts(groups), vw, vh, math.inf, max_iterations=recipe["iterations"])
+    else:
+        layout = engine.pack_layout(anonymous_parts(groups), vw, vh, recipe["order"])
+    return layout.relabel(names_by_dims)
+
+
+def rebuild_offcut_layout(offcut, kerf):
+    """ハンドルの端材1枚 {"id", "w", "d", "parts", "key"} の SheetLayout を作り直す。"""
+    return offcut_layout(TrunkTechEngine(kerf=kerf), offcut["w"], offcut["d"], offcut["parts"])
+
+
+def resolve_result(handle):
+    """置き場を使わずにハンドルから結果を作り直す（バッチ処理など用）。"""
+    result = {**handle, "layout": rebuild_layout(handle["recipe"])}
+    if "offcuts" in handle:
+        kerf = handle["recipe"]["kerf"]
+        result["offcuts"] = [{**o, "layout": rebuild_offcut_layout(o, kerf)} for o in handle["offcuts"]]
+    return result
+
+
+class ResultStore:
+    """木取り結果（SheetLayout）の置き場（スレッドセーフ）。キーは SheetLayout.digest。
+    合計（SheetLayout.nbytes）が max_bytes を超えたら古く使われていないものから捨てる。"""
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = max_bytes or DEFAULT_MAX_BYTES
+        self.nbytes = 0
+        self.hits = 0
+        self.rebuilds = 0
+        self.shared = 0  # 既に同じ内容の結果があったので、新しく置かずに済んだ回数
+        self._items = OrderedDict()  # digest → (SheetLayout, バイト数)
+        self._lock = threading.Lock()
+
+    def put(self, result, recipe):
+        """結果を置き、セッションに持たせるハンドル（レイアウト以外の結果の値 ＋ "key" ＋ "recipe"）を返す。
+        端材の配置も置き、ハンドルの "offcuts" には SheetLayout の代わりにその "key" を入れる。"""
+        handle = {k: v for k, v in result.items() if k not in _HEAVY_KEYS}
+        handle["key"] = self._put_layout(result["layout"])
+        handle["recipe"] = recipe
+        if "offcuts" in result:
+            handle["offcuts"] = [
+                {**{k: v for k, v in o.items() if k != "layout"}, "key": self._put_layout(o["layout"])}
+                for o in result["offcuts"]
+            ]
+        return handle
+
+    def _put_layout(self, layout):
+        key = layout.digest()
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.shared += 1
+            else:
+                self._remember(key, layout)
+        return key
+
+    def get(self, key):
+        """置いてあれば SheetLayout を、無ければ None を返す。"""
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def resolve(self, handle):
+        """ハンドルから結果（evaluate_candidates の best と同じ形の dict）を返す。捨てられていれば作り直して置き直す。"""
+        layout = self._get_or_rebuild(handle["key"], lambda: rebuild_layout(handle["recipe"], self))
+        result = {**handle, "layout": layout}
+        if "offcuts" in handle:
+            kerf = handle["recipe"]["kerf"]
+            result["offcuts"] = [
+                {**o, "layout": self._get_or_rebuild(o["key"], lambda o=o: rebuild_offcut_layout(o, kerf))}
+                for o in handle["offcuts"]
+            ]
+        return result
+
+    def _get_or_rebuild(self, key, rebuild):
+        layout = self.get(key)
+        if layout is None:
+            layout = rebuild()
+            with self._lock:
+                self.rebuilds += 1
+                if key not in self._items:
+                    self._remember(key, layout)
+        return layout
+
+    def _remember(self, key, layout):
+        size = layout.nbytes()
+        if size > self.max_bytes:
+            return  # 1件で上限を超えるものは置かない（使うたびに作り直す）
+        self._items[key] = (layout, size)
+        self.nbytes += size
+        while self.nbytes > self.max_bytes:
+            _, (_, old) = self._items.popitem(last=False)
+            self.nbytes -= old
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        return {
+            "hits": self.hits, "rebuilds": self.rebuilds, "shared": self.shared,
+            "entries": len(self._items), "bytes": self.nbytes, "max_bytes": self.max_bytes,
+        }
@@ -0,0 +1,100 @@
+# 木取図の SVG 描画（matplotlib を使わない）
+# 座標は mm のまま viewBox に置き、日本語は CSS のフォント指定でブラウザ側のフォントを使う。
+
+from html import escape
+
+# matplotlib 版（trunktech.render.draw_sheet_png）と同じ色・文字の並び
+BOARD_FILL = "#fdf5e6"
+BOARD_STROKE = "#8b4513"
+PART_FILL = "#deb887"
+FONT_FAMILY = "'IPAexGothic', 'Noto Sans CJK JP', 'Hiragino Sans', 'Yu Gothic', 'Meiryo', sans-serif"
+
+
+def _num(v):
+    """座標を短い文字列に（小数は 0.01mm まで）"""
+    return format(round(v, 2), "g")
+
+
+def sheet_title(layout, s, label):
+    v_w_full, v_h_full = layout.vw + 2, layout.vh + 2
+    return f"【木取り図】 ID:{s + 1} ({label}：{int(v_w_full)}x{int(v_h_full)})"
+
+
+def pattern_name(k):
+    """k 番目（0始まり）のパターンの名前: A, B, …, Z, AA, AB, …"""
+    name = ""
+    k += 1
+    while k:
+        k, r = divmod(k - 1, 26)
+        name = chr(ord("A") + r) + name
+    return name
+
+
+def format_ids(sheets, max_runs=6):
+    """板の添字（昇順）を板 ID の範囲で書く: [0, 1, 2, 5] → "1〜3, 6"。範囲が多ければ max_runs 個で省略する。"""
+    runs = []
+    for s in sheets:
+        if runs and runs[-1][1] == s:
+            runs[-1][1] = s + 1
+        else:
+            runs.append([s + 1, s + 1])
+    text = ", ".join(f"{a}〜{b}" if b > a else str(a) for a, b in runs[:max_runs])
+    return text + ("…" if len(runs) > max_runs else "")
+
+
+def pattern_title(layout, k, sheets, label, thumbnail=False):
+    """k 番目のパターン（同じ並びの板 sheets）の題。縮小図では「A ×12」だけにする。"""
+    name = pattern_name(k)
+    if thumbnail:
+        return f"{name} ×{len(sheets)}"
+    v_w_full, v_h_full = layout.vw + 2, layout.vh + 2
+    return f"【木取り図】 パターン{name} ×{len(sheets)} ID:{format_ids(sheets)} ({label}：{int(v_w_full)}x{int(v_h_full)})"
+
+
+def offcut_title(offcut, thumbnail=False):
+    """端材（pack_offcuts の要素 {"id", "w", "d", ...}）の木取図の題"""
+    if thumbnail:
+        return f"端材#{offcut['id']}"
+    return f"【木取り図】 端材#{offcut['id']} ({int(offcut['w'])}x{int(offcut['d'])})"
+
+
+def render_sheet_svg(layout, s, label, css_class=None, thumbnail=False, title=None):
+    """layout の s 番目（0始まり）の板の木取図を SVG 文字列で返す。
+    matplotlib と同じく板の左下を原点とし、上下を反転して描く。
+    thumbnail=True なら一覧用の縮小図（題は板 ID だけ・部品名と寸法の文字なし・座標は 1mm 単位）。
+    title を渡すと題をそれにする（パターンの題など）。"""
+    v_w_full, v_h_full = layout.vw + 2, layout.vh + 2
+    unit = v_w_full / 100.0  # 文字の大きさ・線の太さの基準（板の長手の 1%）
+    title_h = unit * 4.5
+    pad = unit
+    width, height = v_w_full + 2 * pad, v_h_full + title_h + 2 * pad
+    cls = f' class="{css_class}"' if css_class else ""
+    if title is None:
+        title = f"ID:{s + 1}" if thumbnail else sheet_title(layout, s, label)
+    num = (lambda v: str(round(v))) if thumbnail else _num
+    out = [
+        f'<svg xmlns="http://www.w3.org/2000/svg"{cls} viewBox="0 0 {_num(width)} {_num(height)}" '
+        f'preserveAspectRatio="xMidYMid meet" font-family="{escape(FONT_FAMILY)}" font-weight="bold">',
+        f'<text x="{_num(width / 2)}" y="{_num(pad + unit * 3)}" font-size="{_num(unit * 2.6)}" '
+        f'text-anchor="middle">{escape(title)}</text>',
+        f'<g transform="translate({_num(pad)} {_num(pad + title_h)})">',
+        f'<rect width="{_num(v_w_full)}" height="{_num(v_h_full)}" fill="{BOARD_FILL}" '
+        f'stroke="{BOARD_STROKE}" stroke-width="{_num(unit * 0.4)}"/>',
+    ]
+    fs = unit * 1.6
+    for n, x, y, w, h in layout.parts(s):
+        top = v_h_full - y - h
+        out.append(
+            f'<rect x="{num(x)}" y="{num(top)}" width="{num(w)}" height="{num(h)}" '
+            f'fill="{PART_FILL}" fill-opacity="0.8" stroke="#000" stroke-width="{_num(unit * 0.2)}"/>'
+        )
+        if thumbnail:
+            continue
+        cx, cy = x + w / 2, top + h / 2
+        out.append(
+            f'<text x="{_num(cx)}" y="{_num(cy)}" font-size="{_num(fs)}" text-anchor="middle">'
+            f'<tspan x="{_num(cx)}" dy="{_num(-fs * 0.15)}">{escape(str(n))}</tspan>'
+            f'<tspan x="{_num(cx)}" dy="{_num(fs * 1.15)}">{int(w)}x{int(h)}</tspan></text>'
+        )
+    out.append("</g></svg>")
+    return "".join(out)